@@ -6,14 +6,28 @@ import urllib  # Import urllib for URL handling
 import json  # Import json for handling JSON data
 import time  # Import time for time-related functions
 from helpers import *  # Import custom helper functions
+from config import GBFS_STATION_STATUS_URL, GBFS_STATION_INFORMATION_URL  # Import feed locations
+from config import LIVE_MAP_SECONDS  # Import the live map refresh interval
+from live_map import live_map, forget_live_map  # Import the in-place updating station map
+from profiling import profile_rerun  # Import the opt-in rerun profiler
 import folium  # Import folium for creating interactive maps
 from streamlit_folium import folium_static  # Import folium_static to render Folium maps in Streamlit
 import os  # Import os for file path operations
 from folium.plugins import MarkerCluster, HeatMap, Fullscreen, MeasureControl, LocateControl  # Import additional folium plugins
 
+# Profile a sample of reruns when FINDBIKE_PROFILE_SAMPLE, or ?profile= with the right ?profile_token=, asks for it
+profile_rerun(st.query_params.get("profile"), st.query_params.get("profile_token"))
+
 # URL to fetch bike share data 
-station_url = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_status"
-latlon_url = "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_information"
+station_url = GBFS_STATION_STATUS_URL
+latlon_url = GBFS_STATION_INFORMATION_URL
+
+# Function to offer known addresses completing what was typed in a street box; returns the address to use
+def choose_address(input_street, input_city, key):
+    suggestions = suggest_addresses(input_street, input_city)
+    if len(suggestions) == 0:
+        return input_street
+    return st.selectbox("Did you mean", [input_street] + suggestions, key=key)
 
 # Load custom CSS
 def load_css():
@@ -41,9 +55,11 @@ with header_col2:
 st.markdown("<hr style='margin: 1rem 0; border: 0; border-top: 1px solid #e0e0e0;'>", unsafe_allow_html=True)
 
 # Fetch data for initial visualization
-data_df = query_station_status(station_url)  # Get station status data
-latlon_df = get_station_latlon(latlon_url)  # Get station latitude and longitude data
-data = join_latlon(data_df, latlon_df)  # Join the status data with the location data
+try:
+    data = get_station_snapshot(station_url, latlon_url)  # Get station status joined with station locations
+except UpstreamError:
+    st.error("🚲 Live station data is temporarily unavailable. Please try again in a minute.")
+    st.stop()
 
 # Display metrics in styled cards
 st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">System Status</h2>', unsafe_allow_html=True)
@@ -176,8 +192,11 @@ deltas = [
 # Initialize variables for user input and state
 iamhere = 0
 iamhere_return = 0
+trip_origin = 0
+trip_destination = 0
 findmeabike = False
 findmeadock = False
+findmeatrip = False
 input_bike_modes = []
 
 # Enhanced sidebar with better UI
@@ -216,15 +235,17 @@ with st.sidebar:
     st.markdown('<div class="sidebar-form">', unsafe_allow_html=True)
     bike_method = st.selectbox(
         "What would you like to do?", 
-        ("Rent a bike", "Return a bike"),
-        format_func=lambda x: "🚲 " + x if x == "Rent a bike" else "🔒 " + x
+        ("Rent a bike", "Return a bike", "Plan a trip"),
+        format_func=lambda x: {"Rent a bike": "🚲 ", "Return a bike": "🔒 ", "Plan a trip": "🗺️ "}[x] + x
     )
     
     # Description based on selection
     if bike_method == "Rent a bike":
         st.markdown('<p class="form-description">Find available bikes near your location</p>', unsafe_allow_html=True)
-    else:
+    elif bike_method == "Return a bike":
         st.markdown('<p class="form-description">Find available docks to return your bike</p>', unsafe_allow_html=True)
+    else:
+        st.markdown('<p class="form-description">Find the fastest walk, ride and dock to reach your destination</p>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Rent a bike form
@@ -251,6 +272,7 @@ with st.sidebar:
             input_city = st.text_input("City", "Toronto")
         with loc_col2:
             input_country = st.text_input("Country", "Canada")
+        input_street = choose_address(input_street, input_city, "suggest_rent")
             
         # Transportation option with better UI
         drive = st.checkbox("🚗 I'm driving there", help="Check this if you plan to drive to the station")
@@ -265,8 +287,10 @@ with st.sidebar:
         # Error handling with better styling
         if findmeabike:
             if input_street != "":
-                iamhere = geocode(input_street + " " + input_city + " " + input_country)
-                if iamhere == '':
+                iamhere = locate(input_street, input_city, input_country)
+                if iamhere is GEOCODER_UNAVAILABLE:
+                    st.error("📍 Address lookup is temporarily unavailable. Please try again in a minute.")
+                elif iamhere == '':
                     st.error("📍 We couldn't find that address. Please check and try again.")
             else:
                 st.warning("📍 Please enter your street address so we can find bikes near you.")
@@ -285,6 +309,7 @@ with st.sidebar:
             input_city_return = st.text_input("City", "Toronto")
         with loc_col2:
             input_country_return = st.text_input("Country", "Canada")
+        input_street_return = choose_address(input_street_return, input_city_return, "suggest_return")
         
         # Primary button with better styling
         findmeadock = st.button(
@@ -296,13 +321,61 @@ with st.sidebar:
         # Error handling with better styling
         if findmeadock:
             if input_street_return != "":
-                iamhere_return = geocode(input_street_return + " " + input_city_return + " " + input_country_return)
-                if iamhere_return == '':
+                iamhere_return = locate(input_street_return, input_city_return, input_country_return)
+                if iamhere_return is GEOCODER_UNAVAILABLE:
+                    st.error("📍 Address lookup is temporarily unavailable. Please try again in a minute.")
+                elif iamhere_return == '':
                     st.error("📍 We couldn't find that address. Please check and try again.")
             else:
                 st.warning("📍 Please enter your street address so we can find docks near you.")
         st.markdown('</div>', unsafe_allow_html=True)
     
+    # Plan a trip form
+    elif bike_method == "Plan a trip":
+        st.markdown('<div class="sidebar-form">', unsafe_allow_html=True)
+        st.markdown('<p class="form-header">Bike Preferences</p>', unsafe_allow_html=True)
+        input_bike_modes = st.multiselect(
+            "What type of bike are you looking for?", 
+            ["ebike", "mechanical"],
+            format_func=lambda x: "⚡ E-Bike" if x == "ebike" else "🔧 Mechanical Bike"
+        )
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Origin and destination form
+        st.markdown('<div class="sidebar-form">', unsafe_allow_html=True)
+        st.markdown('<p class="form-header">📍 Your Trip</p>', unsafe_allow_html=True)
+        input_street_origin = st.text_input("From", placeholder="e.g. 100 Queen Street West")
+        input_street_destination = st.text_input("To", placeholder="e.g. 1 Blue Jays Way")
+        
+        # Use columns for city and country to save space
+        loc_col1, loc_col2 = st.columns(2)
+        with loc_col1:
+            input_city_trip = st.text_input("City", "Toronto")
+        with loc_col2:
+            input_country_trip = st.text_input("Country", "Canada")
+        input_street_origin = choose_address(input_street_origin, input_city_trip, "suggest_origin")
+        input_street_destination = choose_address(input_street_destination, input_city_trip, "suggest_destination")
+        
+        # Primary button with better styling
+        findmeatrip = st.button(
+            "🔍 Plan my trip!", 
+            type="primary",
+            use_container_width=True
+        )
+        
+        # Error handling with better styling
+        if findmeatrip:
+            if input_street_origin != "" and input_street_destination != "":
+                trip_origin = locate(input_street_origin, input_city_trip, input_country_trip)
+                trip_destination = locate(input_street_destination, input_city_trip, input_country_trip)
+                if trip_origin is GEOCODER_UNAVAILABLE or trip_destination is GEOCODER_UNAVAILABLE:
+                    st.error("📍 Address lookup is temporarily unavailable. Please try again in a minute.")
+                elif trip_origin == '' or trip_destination == '':
+                    st.error("📍 We couldn't find one of those addresses. Please check and try again.")
+            else:
+                st.warning("📍 Please enter both a starting address and a destination.")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
     # Add help information at the bottom of sidebar
     st.markdown('<div style="margin-top: 2rem; padding: 1rem; background-color: #f5f7fa; border-radius: 8px; font-size: 0.9rem;">', unsafe_allow_html=True)
     st.markdown('<p style="color: #1e88e5; font-weight: 600; margin-bottom: 0.5rem;">💡 Tips</p>', unsafe_allow_html=True)
@@ -454,13 +527,23 @@ with map_container:
     st.markdown('<div class="map-container">', unsafe_allow_html=True)
     
     # Initial map setup based on user selection
-    if (bike_method == "Return a bike" and findmeadock == False) or (bike_method == "Rent a bike" and findmeabike == False):
+    if (bike_method == "Return a bike" and findmeadock == False) or (bike_method == "Rent a bike" and findmeabike == False) or (bike_method == "Plan a trip" and findmeatrip == False):
         # Toronto city center coordinates
         center = [43.65306613746548, -79.38815311015]
         
-        # Create and display the enhanced map
-        m = create_enhanced_map(center, data)
-        folium_static(m, width=800, height=500)
+        if LIVE_MAP_SECONDS > 0:
+            # Refresh only the map on a timer, sending the browser just the stations that changed
+            @st.experimental_fragment(run_every=LIVE_MAP_SECONDS)
+            def show_live_map(center):
+                try:
+                    live_map(lambda since: get_station_update(station_url, latlon_url, since), center, height=500)
+                except UpstreamError as e:
+                    st.warning(f"⚠️ Live station updates are paused: {e}")
+            show_live_map(center)
+        else:
+            # Create and display the enhanced map
+            m = create_enhanced_map(center, data)
+            folium_static(m, width=800, height=500)
         
         # Add map legend and explanation
         legend_col1, legend_col2, legend_col3 = st.columns(3)
@@ -485,6 +568,8 @@ with map_container:
                 <span style="font-size: 0.9rem;">No bikes available</span>
             </div>
             """, unsafe_allow_html=True)
+    else:
+        forget_live_map()  # The live map is not on the page this time
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -492,7 +577,7 @@ with map_container:
 results_container = st.container()
 
 # Function to create a better route map
-def create_route_map(user_location, station_location, station_id, mode="rent"):
+def create_route_map(user_location, station_location, station_id, mode="rent", profile="foot"):
     # Center the map on the user's location
     center = user_location
     
@@ -522,6 +607,9 @@ def create_route_map(user_location, station_location, station_id, mode="rent"):
     if mode == "rent":
         station_popup = f"<b>Bike Station {station_id}</b><br>Rent your bike here"
         tooltip_text = "Rent bikes here"
+    elif mode == "vehicle":
+        station_popup = f"<b>Free-floating e-bike {station_id}</b><br>Unlock it where it's parked"
+        tooltip_text = "Free-floating e-bike"
     else:  # mode == "return"
         station_popup = f"<b>Bike Station {station_id}</b><br>Return your bike here"
         tooltip_text = "Return bikes here"
@@ -534,7 +622,7 @@ def create_route_map(user_location, station_location, station_id, mode="rent"):
     ).add_to(m)
     
     # Get route coordinates and duration
-    coordinates, duration = run_osrm([station_id, station_location[0], station_location[1]], user_location)
+    coordinates, duration = get_route([station_id, station_location[0], station_location[1]], user_location, profile)
     
     # Add route line with better styling
     route = folium.PolyLine(
@@ -556,18 +644,125 @@ def create_route_map(user_location, station_location, station_id, mode="rent"):
     
     return m, duration
 
+# Function to create a map of a full trip: walk to the pickup station, ride, walk from the drop-off station
+def create_trip_map(origin, destination, trip):
+    pickup = (trip['pickup'][1], trip['pickup'][2])
+    dropoff = (trip['dropoff'][1], trip['dropoff'][2])
+    
+    # Create a map with a modern style
+    m = folium.Map(
+        location=origin,
+        zoom_start=14,
+        tiles='cartodbpositron',
+        control_scale=True
+    )
+    folium.plugins.Fullscreen().add_to(m)
+    
+    # Add start, station and destination markers
+    folium.Marker(
+        location=origin,
+        popup=folium.Popup("<b>Start</b>", max_width=200),
+        tooltip="You are here",
+        icon=folium.Icon(color="blue", icon="user", prefix="fa")
+    ).add_to(m)
+    folium.Marker(
+        location=pickup,
+        popup=folium.Popup(f"<b>Bike Station {trip['pickup'][0]}</b><br>Pick up your bike here", max_width=200),
+        tooltip="Pick up here",
+        icon=folium.Icon(color="green", icon="bicycle", prefix="fa")
+    ).add_to(m)
+    folium.Marker(
+        location=dropoff,
+        popup=folium.Popup(f"<b>Bike Station {trip['dropoff'][0]}</b><br>Dock your bike here", max_width=200),
+        tooltip="Dock here",
+        icon=folium.Icon(color="green", icon="lock", prefix="fa")
+    ).add_to(m)
+    folium.Marker(
+        location=destination,
+        popup=folium.Popup("<b>Destination</b>", max_width=200),
+        tooltip="Destination",
+        icon=folium.Icon(color="red", icon="flag", prefix="fa")
+    ).add_to(m)
+    
+    # Only the chosen pair is routed in full; the search itself used duration matrices
+    legs = [
+        (trip['pickup'], origin, "foot", "#1e88e5", "10, 10", "Walk"),
+        (trip['dropoff'], pickup, "bike", "#43a047", None, "Ride"),
+        ([None, destination[0], destination[1]], dropoff, "foot", "#1e88e5", "10, 10", "Walk"),
+    ]
+    for leg_end, leg_start, profile, color, dash_array, label in legs:
+        coordinates, duration = get_route(leg_end, leg_start, profile)
+        folium.PolyLine(
+            locations=coordinates,
+            color=color,
+            weight=5,
+            opacity=0.8,
+            tooltip=f"{label}: {duration} minutes",
+            dash_array=dash_array
+        ).add_to(m)
+    
+    # Fit the map to show the whole trip
+    m.fit_bounds([origin, pickup, dropoff, destination], padding=(30, 30))
+    
+    return m
+
+# Function to display the time breakdown of a planned trip
+def display_trip_details(trip):
+    trip_html = f"""
+    <div class="metric-card" style="text-align: left;">
+        <div class="metric-label">Total Trip Time</div>
+        <div class="metric-value">{trip['total']} min</div>
+        <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+            <span>🚶 Walk to station {trip['pickup'][0]}</span><span>{trip['walk_to']} min</span>
+        </div>
+        <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+            <span>🚲 Ride to station {trip['dropoff'][0]}</span><span>{trip['ride']} min</span>
+        </div>
+        <div style="display: flex; justify-content: space-between;">
+            <span>🚶 Walk to destination</span><span>{trip['walk_from']} min</span>
+        </div>
+    </div>
+    """
+    st.markdown(trip_html, unsafe_allow_html=True)
+
+# Function to display a free-floating vehicle details card
+def display_vehicle_details(vehicle, duration, travel_label="Walking distance"):
+    vehicle_html = f"""
+    <div class="station-card">
+        <div class="station-header">
+            <div class="station-icon">⚡</div>
+            <div>
+                <h3 class="station-title">E-Bike {vehicle[0]}</h3>
+                <p class="station-subtitle">Free-floating, closer than any station</p>
+            </div>
+        </div>
+        
+        <div class="station-detail">
+            <span class="detail-label">Distance:</span>
+            <span class="detail-value">{round(vehicle[3] * 1000)} m</span>
+        </div>
+        
+        <div class="travel-time">
+            <div class="time-label">Estimated Travel Time</div>
+            <div class="time-value">{duration} min</div>
+            <div class="time-label">{travel_label}</div>
+        </div>
+    </div>
+    """
+    st.markdown(vehicle_html, unsafe_allow_html=True)
+
 # Function to display station details card
-def display_station_details(station_id, data, duration, mode="rent"):
+def display_station_details(station_id, data, duration, mode="rent", travel_label="Walking distance"):
     # Create a container for this station details to isolate any errors
     station_container = st.container()
     
     with station_container:
-        # Get station data - convert station_id to integer for proper comparison
+        # Get station data - convert station_id to a string for proper comparison
         try:
             # Handle different types of station_id (int, string, pandas Series)
             if hasattr(station_id, 'item'):
                 station_id = station_id.item()
-            station_id = int(station_id)
+            station_id = str(station_id)  # Station ids are parsed as strings
             
             # Find the station in the data
             station_data = data[data['station_id'] == station_id]
@@ -707,7 +902,7 @@ def display_station_details(station_id, data, duration, mode="rent"):
         <div class="travel-time">
             <div class="time-label">Estimated Travel Time</div>
             <div class="time-value">{duration} min</div>
-            <div class="time-label">Walking distance</div>
+            <div class="time-label">{travel_label}</div>
         </div>
     </div>
     """
@@ -719,68 +914,127 @@ def display_station_details(station_id, data, duration, mode="rent"):
 with results_container:
     if findmeabike:
         if input_street != "":
-            if iamhere != "":
+            if iamhere not in ("", GEOCODER_UNAVAILABLE):
                 # Display a loading spinner while processing
                 with st.spinner("Finding the best bike station for you..."):
                     # Get bike availability
                     chosen_station = get_bike_availability(iamhere, data, input_bike_modes)
                     
-                    # Make sure we have a valid station ID (convert from pandas Series if needed)
-                    station_id = chosen_station[0]
-                    if hasattr(station_id, 'item'):
-                        station_id = station_id.item()
+                    if chosen_station is not None:
+                        # Make sure we have a valid station ID (convert from pandas Series if needed)
+                        station_id = chosen_station[0]
+                        if hasattr(station_id, 'item'):
+                            station_id = station_id.item()
+                        
+                        # Offer a free-floating e-bike instead when one is parked closer than the station
+                        station_km = haversine_km(iamhere, [chosen_station[1]], [chosen_station[2]])[0]
+                        vehicle = get_free_vehicle_availability(iamhere, input_bike_modes, max_km=station_km)
+                    else:
+                        # No station has a bike right now, so look for a free-floating e-bike within the default radius
+                        vehicle = get_free_vehicle_availability(iamhere, input_bike_modes)
                     
-                    # Display results header
-                    st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended Bike Station</h2>', unsafe_allow_html=True)
+                    if chosen_station is None and vehicle is None:
+                        st.error("🚲 No bikes are available near you right now. Please try again in a few minutes.")
+                    else:
+                        # Display results header
+                        if vehicle is not None:
+                            st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended E-Bike</h2>', unsafe_allow_html=True)
+                        else:
+                            st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended Bike Station</h2>', unsafe_allow_html=True)
                     
-                    # Create two columns for results display
-                    result_col1, result_col2 = st.columns([2, 1])
+                        # Create two columns for results display
+                        result_col1, result_col2 = st.columns([2, 1])
                     
-                    with result_col1:
-                        # Create and display the route map
-                        route_map, duration = create_route_map(
-                            iamhere, 
-                            (chosen_station[1], chosen_station[2]), 
-                            station_id, 
-                            mode="rent"
-                        )
-                        folium_static(route_map, width=600, height=400)
+                        with result_col1:
+                            # Create and display the route map
+                            if vehicle is not None:
+                                route_map, duration = create_route_map(
+                                    iamhere,
+                                    (vehicle[1], vehicle[2]),
+                                    vehicle[0],
+                                    mode="vehicle",
+                                    profile="driving" if drive else "foot"
+                                )
+                            else:
+                                route_map, duration = create_route_map(
+                                    iamhere, 
+                                    (chosen_station[1], chosen_station[2]), 
+                                    station_id, 
+                                    mode="rent",
+                                    profile="driving" if drive else "foot"
+                                )
+                            folium_static(route_map, width=600, height=400)
                     
-                    with result_col2:
-                        # Display station details
-                        display_station_details(station_id, data, duration, mode="rent")
+                        with result_col2:
+                            # Display vehicle or station details
+                            if vehicle is not None:
+                                display_vehicle_details(vehicle, duration, travel_label="Driving time" if drive else "Walking distance")
+                            else:
+                                display_station_details(station_id, data, duration, mode="rent", travel_label="Driving time" if drive else "Walking distance")
 
 # Logic for finding a dock - enhanced version
 with results_container:
     if findmeadock:
         if input_street_return != "":
-            if iamhere_return != "":
+            if iamhere_return not in ("", GEOCODER_UNAVAILABLE):
                 # Display a loading spinner while processing
                 with st.spinner("Finding the best dock for your bike return..."):
                     # Get dock availability
                     chosen_station = get_dock_availability(iamhere_return, data)
                     
-                    # Make sure we have a valid station ID (convert from pandas Series if needed)
-                    station_id = chosen_station[0]
-                    if hasattr(station_id, 'item'):
-                        station_id = station_id.item()
+                    if chosen_station is None:
+                        st.error("🅿️ No docks are free near you right now. Please try again in a few minutes.")
+                    else:
+                        # Make sure we have a valid station ID (convert from pandas Series if needed)
+                        station_id = chosen_station[0]
+                        if hasattr(station_id, 'item'):
+                            station_id = station_id.item()
+                    
+                        # Display results header
+                        st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended Return Station</h2>', unsafe_allow_html=True)
                     
-                    # Display results header
-                    st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended Return Station</h2>', unsafe_allow_html=True)
+                        # Create two columns for results display
+                        result_col1, result_col2 = st.columns([2, 1])
                     
-                    # Create two columns for results display
-                    result_col1, result_col2 = st.columns([2, 1])
+                        with result_col1:
+                            # Create and display the route map
+                            route_map, duration = create_route_map(
+                                iamhere_return, 
+                                (chosen_station[1], chosen_station[2]), 
+                                station_id, 
+                                mode="return",
+                                profile="bike"
+                            )
+                            folium_static(route_map, width=600, height=400)
                     
-                    with result_col1:
-                        # Create and display the route map
-                        route_map, duration = create_route_map(
-                            iamhere_return, 
-                            (chosen_station[1], chosen_station[2]), 
-                            station_id, 
-                            mode="return"
-                        )
-                        folium_static(route_map, width=600, height=400)
+                        with result_col2:
+                            # Display station details
+                            display_station_details(station_id, data, duration, mode="return", travel_label="Cycling time")
+
+# Logic for planning a trip
+with results_container:
+    if findmeatrip:
+        if input_street_origin != "" and input_street_destination != "":
+            if trip_origin not in ("", GEOCODER_UNAVAILABLE) and trip_destination not in ("", GEOCODER_UNAVAILABLE):
+                # Display a loading spinner while processing
+                with st.spinner("Planning the fastest trip for you..."):
+                    # Pick the best pickup and drop-off stations by total travel time
+                    trip = plan_trip(trip_origin, trip_destination, data, input_bike_modes)
                     
-                    with result_col2:
-                        # Display station details
-                        display_station_details(station_id, data, duration, mode="return")
\ No newline at end of file
+                    if trip is None:
+                        st.error("🚲 We couldn't find stations with bikes and docks for this trip.")
+                    else:
+                        # Display results header
+                        st.markdown('<h2 style="color: #1e88e5; margin-bottom: 1rem;">Your Recommended Trip</h2>', unsafe_allow_html=True)
+                        
+                        # Create two columns for results display
+                        result_col1, result_col2 = st.columns([2, 1])
+                        
+                        with result_col1:
+                            # Create and display the trip map
+                            trip_map = create_trip_map(trip_origin, trip_destination, trip)
+                            folium_static(trip_map, width=600, height=400)
+                        
+                        with result_col2:
+                            # Display the time breakdown
+                            display_trip_details(trip)
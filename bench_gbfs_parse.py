@@ -0,0 +1,64 @@
+"""Benchmark the streaming GBFS parser against reading and decoding the whole feed at once.
+
+Example:
+    python bench_gbfs_parse.py --stations 700 20000 100000
+"""
+import io  # Import io to serve the feed from memory like an HTTP response
+import json  # Import json for the whole-document path
+import time  # Import time for parse timings
+import argparse  # Import argparse for the command line interface
+import tracemalloc  # Import tracemalloc to measure peak memory
+import pandas as pd  # Import pandas to build the DataFrame both ways
+from loadtest import make_feeds  # Import the synthetic feed generator
+from gbfs_stream import parse_feed  # Import the streaming parser
+from helpers import STATION_STATUS_COLUMNS  # Import the columns the app keeps
+
+
+# Define the function for the previous path: read, decode and load the whole body, then build the DataFrame
+def parse_whole(stream):
+    data = json.loads(stream.read().decode())
+    df = pd.DataFrame(data['data']['stations'])
+    return pd.concat([df, df['num_bikes_available_types'].apply(pd.Series)], axis=1)
+
+
+# Define the function for the streaming path
+def parse_streaming(stream):
+    _, columns = parse_feed(stream, 'stations', STATION_STATUS_COLUMNS)
+    return pd.DataFrame(columns)
+
+
+# Define the function to time a parser and measure its peak traced memory
+def measure(parser, body, repeat):
+    times = []
+    for _ in range(repeat):
+        stream = io.BytesIO(body)
+        start = time.perf_counter()
+        parser(stream)
+        times.append(time.perf_counter() - start)
+    stream = io.BytesIO(body)  # The body itself is allocated before tracing starts
+    tracemalloc.start()
+    df = parser(stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, nargs='+', default=[700, 20000, 100000], help='feed sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    print("{:>9} {:>10} {:>12} {:>12} {:>12} {:>12}".format(
+        "records", "body MB", "whole ms", "stream ms", "whole MB", "stream MB"))
+    for n in args.stations:
+        body, _ = make_feeds(n)
+        whole_s, whole_peak, rows = measure(parse_whole, body, args.repeat)
+        stream_s, stream_peak, stream_rows = measure(parse_streaming, body, args.repeat)
+        assert rows == stream_rows
+        print("{:>9} {:>10.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            n, len(body) / 2 ** 20, whole_s * 1000, stream_s * 1000, whole_peak / 2 ** 20, stream_peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark the local engine's duration matrix against one plain Dijkstra search per source.
+
+The street graph is a synthetic city grid with about 50 m blocks and slightly uneven edge lengths.
+Example:
+    python bench_routing.py --size 250 --points 12 36
+"""
+import math  # Import math for the grid spacing in degrees
+import time  # Import time for build and query timings
+import heapq  # Import heapq for the reference Dijkstra search
+import random  # Import random for edge lengths and trip end points
+import argparse  # Import argparse for the command line interface
+from array import array  # Import array for the grid's edge arrays
+from routing import StreetGraph, PROFILE_SPEEDS, haversine_m  # Import the engine being measured
+
+# Centre of the synthetic grid (downtown Toronto) and the block size in metres
+CENTER = (43.6532, -79.3832)
+BLOCK_M = 50.0
+
+
+# Define the function to build a size x size grid graph for the bike profile
+def make_grid(size, seed=0):
+    rng = random.Random(seed)
+    dlat = BLOCK_M / 111000
+    dlon = BLOCK_M / (111000 * math.cos(math.radians(CENTER[0])))
+    lat = array('d')
+    lon = array('d')
+    for y in range(size):
+        for x in range(size):
+            lat.append(CENTER[0] + (y - size / 2) * dlat)
+            lon.append(CENTER[1] + (x - size / 2) * dlon)
+    # Uneven blocks avoid ties between paths; a block is as long in both directions
+    north = [BLOCK_M * rng.uniform(1.0, 1.2) for _ in range(size * size)]  # From each node to the one above
+    east = [BLOCK_M * rng.uniform(1.0, 1.2) for _ in range(size * size)]  # From each node to the one right of it
+    offsets = array('l', [0])
+    targets = array('l')
+    lengths = array('f')
+    for y in range(size):
+        for x in range(size):
+            node = y * size + x
+            for ok, nxt, length in ((y > 0, node - size, north[node - size] if y > 0 else 0),
+                                    (y < size - 1, node + size, north[node]),
+                                    (x > 0, node - 1, east[node - 1] if x > 0 else 0),
+                                    (x < size - 1, node + 1, east[node])):
+                if ok:
+                    targets.append(nxt)
+                    lengths.append(length)
+            offsets.append(len(targets))
+    return lat, lon, {'bike': (offsets, targets, lengths)}
+
+
+# Define the function for the previous approach: one full Dijkstra search per source
+def dijkstra_matrix(graph, sources, targets, profile='bike'):
+    offsets, edge_targets, lengths = graph.adjacency[profile]
+    metres_per_minute = PROFILE_SPEEDS[profile] * 1000 / 60
+    target_nodes = [graph.nearest_node(point, profile) for point in targets]
+    matrix = []
+    for point in sources:
+        source, source_gap = graph.nearest_node(point, profile)
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for e in range(offsets[node], offsets[node + 1]):
+                nxt = edge_targets[e]
+                nd = d + lengths[e]
+                if nd < dist.get(nxt, float('inf')):
+                    dist[nxt] = nd
+                    heapq.heappush(heap, (nd, nxt))
+        matrix.append([round((source_gap + dist[node] + gap) / metres_per_minute, 1) for node, gap in target_nodes])
+    return matrix
+
+
+# Define the function to pick trip end points: candidates around an origin and a destination about 7 km apart
+def trip_points(graph, count, seed=1):
+    rng = random.Random(seed)
+    lat, lon = graph.lat, graph.lon
+    span_lat = (max(lat) - min(lat)) / 2
+    span_lon = (max(lon) - min(lon)) / 2
+    origin = (CENTER[0] - 0.4 * span_lat, CENTER[1] - 0.4 * span_lon)
+    destination = (CENTER[0] + 0.4 * span_lat, CENTER[1] + 0.4 * span_lon)
+    # Candidate stations lie within about 500 m of each end, like plan_trip's nearest stations
+    around = lambda point: [(point[0] + rng.uniform(-0.0045, 0.0045), point[1] + rng.uniform(-0.006, 0.006))
+                            for _ in range(count)]
+    return around(origin), around(destination), haversine_m(origin[0], origin[1], destination[0], destination[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=250, help='grid side in nodes (default 250, 62,500 nodes)')
+    parser.add_argument('--points', type=int, nargs='+', default=[12, 36], help='matrix sizes to benchmark')
+    args = parser.parse_args()
+
+    lat, lon, adjacency = make_grid(args.size)
+    graph = StreetGraph(lat, lon, adjacency)
+    start = time.perf_counter()
+    graph.build_hierarchy()
+    contract_s = time.perf_counter() - start
+    up, down = graph.hierarchy['bike']
+    shortcuts = len(up[1]) + len(down[1]) - len(adjacency['bike'][1])
+    print("{} nodes, {} edges, contracted in {:.1f} s with {} shortcuts".format(
+        len(lat), len(adjacency['bike'][1]), contract_s, shortcuts))
+
+    print("{:>8} {:>8} {:>14} {:>12} {:>9}".format("matrix", "trip km", "dijkstra ms", "buckets ms", "speedup"))
+    for n in args.points:
+        sources, targets, trip_m = trip_points(graph, n)
+        start = time.perf_counter()
+        reference = dijkstra_matrix(graph, sources, targets)
+        dijkstra_s = time.perf_counter() - start
+        start = time.perf_counter()
+        matrix = graph.duration_matrix(sources, targets, 'bike')
+        buckets_s = time.perf_counter() - start
+        assert matrix == reference, "duration matrices differ"
+        print("{:>8} {:>8.1f} {:>14.1f} {:>12.1f} {:>8.1f}x".format(
+            "{}x{}".format(n, n), trip_m / 1000, dijkstra_s * 1000, buckets_s * 1000, dijkstra_s / buckets_s))
+
+
+if __name__ == '__main__':
+    main()
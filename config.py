@@ -0,0 +1,81 @@
+import os  # Import os for reading environment variables and building file paths
+import tempfile  # Import tempfile to locate the default shared cache file
+
+# Directory holding bundled data files (street graph fixture, etc.)
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# GBFS feeds for station status and station locations
+GBFS_STATION_STATUS_URL = os.environ.get(
+    "FINDBIKE_GBFS_STATION_STATUS_URL", "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_status"
+)
+GBFS_STATION_INFORMATION_URL = os.environ.get(
+    "FINDBIKE_GBFS_STATION_INFORMATION_URL", "https://tor.publicbikesystem.net/ube/gbfs/v1/en/station_information"
+)
+
+# Nominatim server used for geocoding (domain and scheme, as accepted by geopy)
+NOMINATIM_DOMAIN = os.environ.get("FINDBIKE_NOMINATIM_DOMAIN", "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.environ.get("FINDBIKE_NOMINATIM_SCHEME", "https")
+
+# Routing backend: "osrm" uses the OSRM HTTP server, "local" uses the built-in street graph engine
+ROUTING_BACKEND = os.environ.get("FINDBIKE_ROUTING_BACKEND", "osrm")
+
+# Base URL of the OSRM server used by the "osrm" backend
+OSRM_URL = os.environ.get("FINDBIKE_OSRM_URL", "http://router.project-osrm.org")
+
+# Profiles the OSRM server really routes. The public demo server only has the car profile and answers foot and
+# bike requests with driving times, so other profiles take its route distances at walking or cycling speed
+OSRM_PROFILES = [p.strip() for p in os.environ.get("FINDBIKE_OSRM_PROFILES", "driving").split(",") if p.strip()]
+
+# Graph file built with routing.py (or a small .osm XML extract) loaded by the "local" backend; defaults to the bundled fixture
+ROUTING_GRAPH_PATH = os.environ.get("FINDBIKE_ROUTING_GRAPH", os.path.join(DATA_DIR, "toronto_fixture.osm"))
+
+# Seconds any single upstream call (GBFS, Nominatim, OSRM) may take before the user stops waiting
+UPSTREAM_TIMEOUT = float(os.environ.get("FINDBIKE_UPSTREAM_TIMEOUT", "5"))
+
+# Worker threads per upstream (GBFS, Nominatim, OSRM); calls beyond them queue for a worker within their deadline
+UPSTREAM_WORKERS = int(os.environ.get("FINDBIKE_UPSTREAM_WORKERS", "8"))
+
+# Consecutive failures that open an upstream's circuit breaker, and seconds before it is retried
+BREAKER_FAILURES = int(os.environ.get("FINDBIKE_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("FINDBIKE_BREAKER_RESET", "30"))
+
+# Seconds a GBFS snapshot is fresh, and how long an older snapshot may still be served while refreshing
+GBFS_FRESH_SECONDS = float(os.environ.get("FINDBIKE_GBFS_FRESH_SECONDS", "30"))
+GBFS_STALE_SECONDS = float(os.environ.get("FINDBIKE_GBFS_STALE_SECONDS", "900"))
+
+# Cache shared by all replicas for feed snapshots, geocodes and routes: "sqlite:///<path>", "redis://host:port/0" or "none"
+SHARED_CACHE_URL = os.environ.get(
+    "FINDBIKE_SHARED_CACHE", "sqlite:///" + os.path.join(tempfile.gettempdir(), "findbike-cache.sqlite3")
+)
+
+# Memory budget in MB for station snapshots held by each process; older snapshots are evicted beyond it
+SNAPSHOT_BUDGET_MB = float(os.environ.get("FINDBIKE_SNAPSHOT_BUDGET_MB", "64"))
+
+# Optional free-floating vehicle feeds: free_bike_status (GBFS v1/v2) or vehicle_status (v3), plus vehicle_types
+# to tell e-bikes apart; leave empty to consider docked stations only
+GBFS_FREE_VEHICLES_URL = os.environ.get("FINDBIKE_GBFS_FREE_VEHICLES_URL", "")
+GBFS_VEHICLE_TYPES_URL = os.environ.get("FINDBIKE_GBFS_VEHICLE_TYPES_URL", "")
+
+# Seconds a free vehicle snapshot is fresh; these feeds change every few seconds
+VEHICLES_FRESH_SECONDS = float(os.environ.get("FINDBIKE_VEHICLES_FRESH_SECONDS", "10"))
+
+# Address index built with `python gazetteer.py build`; when set, addresses in GAZETTEER_CITY resolve locally before Nominatim
+GAZETTEER_PATH = os.environ.get("FINDBIKE_GAZETTEER", "")
+GAZETTEER_CITY = os.environ.get("FINDBIKE_GAZETTEER_CITY", "Toronto")
+
+# Seconds between live station map refreshes, which update markers in place; 0 draws the static map once per rerun
+LIVE_MAP_SECONDS = float(os.environ.get("FINDBIKE_LIVE_MAP_SECONDS", "0"))
+
+# Fraction of reruns to profile (0 turns profiling off)
+PROFILE_SAMPLE = float(os.environ.get("FINDBIKE_PROFILE_SAMPLE", "0"))
+
+# Secret a session must pass as ?profile_token= to profile its own reruns with ?profile=<fraction>; empty turns that off
+PROFILE_TOKEN = os.environ.get("FINDBIKE_PROFILE_TOKEN", "")
+
+# Where profiles are written, how many are kept, and the CPU stack sampling interval in milliseconds
+PROFILE_DIR = os.environ.get("FINDBIKE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "findbike-profiles"))
+PROFILE_KEEP = int(os.environ.get("FINDBIKE_PROFILE_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.environ.get("FINDBIKE_PROFILE_INTERVAL_MS", "5"))
+
+# Share of profiled reruns that also trace allocations; tracing slows the whole process several times while it runs
+PROFILE_ALLOC_SHARE = float(os.environ.get("FINDBIKE_PROFILE_ALLOC_SHARE", "0.1"))
@@ -0,0 +1,105 @@
+import numpy as np  # Import numpy for array-backed vehicle storage and vectorized distances
+
+# Size of a spatial index cell in degrees (roughly 200 m in Toronto)
+CELL_DEG = 0.002
+
+# Offset that keeps cell coordinates positive so (row, col) packs into one int64 key
+_CELL_OFFSET = 1 << 20
+
+# GBFS propulsion types that count as e-bikes
+ELECTRIC_PROPULSION = {'electric_assist', 'electric'}
+
+# Define the function to get the columns kept from free_bike_status (GBFS v1/v2 "bikes") or vehicle_status (v3 "vehicles")
+def vehicle_columns(array_key):
+    id_key = 'vehicle_id' if array_key == 'vehicles' else 'bike_id'
+    return {
+        'vehicle_id': ('str', (id_key,), ''),
+        'lat': ('float64', ('lat',), np.nan),
+        'lon': ('float64', ('lon',), np.nan),
+        'is_reserved': ('int8', ('is_reserved',), 0),
+        'is_disabled': ('int8', ('is_disabled',), 0),
+        'vehicle_type_id': ('str', ('vehicle_type_id',), ''),
+        'current_range_meters': ('float64', ('current_range_meters',), np.nan),
+    }
+
+# Columns kept from vehicle_types, used to tell e-bikes apart from other electric vehicles such as scooters
+VEHICLE_TYPE_COLUMNS = {
+    'vehicle_type_id': ('str', ('vehicle_type_id',), ''),
+    'form_factor': ('str', ('form_factor',), ''),
+    'propulsion_type': ('str', ('propulsion_type',), ''),
+}
+
+
+# Define the function to get the ids of the vehicle types that are e-bikes from vehicle_types columns
+def ebike_type_ids(types):
+    is_ebike = (types['form_factor'] == 'bicycle') & np.isin(types['propulsion_type'], list(ELECTRIC_PROPULSION))
+    return types['vehicle_type_id'][is_ebike]
+
+
+# Define the function to pack cell rows and columns into sortable int64 keys
+def _cell_keys(rows, cols):
+    return (rows.astype(np.int64) + _CELL_OFFSET) * (2 * _CELL_OFFSET) + (cols.astype(np.int64) + _CELL_OFFSET)
+
+
+# Define the function to calculate distances in km from one point to arrays of latitudes and longitudes
+def _haversine_km(lat, lon, lats, lons):
+    lat1, lon1, lat2, lon2 = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+
+class VehicleStore:
+    """Rentable free-floating vehicles in parallel arrays, sorted by grid cell for fast nearby lookups"""
+
+    def __init__(self, columns, ebike_type_ids=None):
+        """ebike_type_ids lists the vehicle types that are e-bikes; None when there is no vehicle_types feed"""
+        # Keep only vehicles someone can rent right now
+        usable = ((columns['is_reserved'] == 0) & (columns['is_disabled'] == 0)
+                  & np.isfinite(columns['lat']) & np.isfinite(columns['lon']))
+        lat = columns['lat'][usable]
+        lon = columns['lon'][usable]
+        if ebike_type_ids is None:
+            # Without vehicle_types, motorized vehicles are the ones publishing a range; the feed is taken to be bikes only
+            is_ebike = np.isfinite(columns['current_range_meters'][usable])
+        else:
+            # A range also comes with scooters and mopeds, so only the types' form factor and propulsion count
+            is_ebike = np.isin(columns['vehicle_type_id'][usable], list(ebike_type_ids))
+
+        # Sort everything by cell so each row of cells is one contiguous slice
+        keys = _cell_keys(np.floor(lat / CELL_DEG), np.floor(lon / CELL_DEG))
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.vehicle_id = columns['vehicle_id'][usable][order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.is_ebike = is_ebike[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Define the function to find the nearest rentable vehicle within max_km of a location
+    def nearest(self, latlon, ebike_only=False, max_km=1.0):
+        """Return [vehicle_id, lat, lon, distance_km] or None if nothing is close enough"""
+        if len(self) == 0:
+            return None
+        row = int(np.floor(latlon[0] / CELL_DEG))
+        col = int(np.floor(latlon[1] / CELL_DEG))
+        # Cells to search in each direction; longitude cells are narrower away from the equator
+        rows_out = int(np.ceil(max_km / (CELL_DEG * 111.2)))
+        cols_out = int(np.ceil(max_km / (CELL_DEG * 111.2 * np.cos(np.radians(latlon[0])))))
+        rows = np.arange(row - rows_out, row + rows_out + 1)
+        lo = np.searchsorted(self.keys, _cell_keys(rows, np.full(len(rows), col - cols_out)), side='left')
+        hi = np.searchsorted(self.keys, _cell_keys(rows, np.full(len(rows), col + cols_out)), side='right')
+        if not (hi > lo).any():
+            return None
+        candidates = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi) if b > a])
+        if ebike_only:
+            candidates = candidates[self.is_ebike[candidates]]
+            if len(candidates) == 0:
+                return None
+        distance = _haversine_km(latlon[0], latlon[1], self.lat[candidates], self.lon[candidates])
+        best = int(np.argmin(distance))
+        if distance[best] > max_km:
+            return None
+        i = candidates[best]
+        return [self.vehicle_id[i], float(self.lat[i]), float(self.lon[i]), float(distance[best])]
@@ -0,0 +1,191 @@
+"""Local address gazetteer: a sorted, memory-mapped index of normalized street addresses.
+
+Build an index from a CSV of address points (one row per address with its coordinates), then
+point FINDBIKE_GAZETTEER at it. Examples:
+    python gazetteer.py build address_points.csv data/addresses.idx --address ADDRESS_FULL --lat LATITUDE --lon LONGITUDE
+    python gazetteer.py lookup data/addresses.idx "100 Queen Street West"
+    python gazetteer.py suggest data/addresses.idx "100 queen"
+"""
+import re  # Import re for address normalization
+import csv  # Import csv to read address point extracts
+import mmap  # Import mmap so the index is paged in by the OS and shared between processes
+import time  # Import time for lookup timings
+import struct  # Import struct for the index header
+import argparse  # Import argparse for the command line interface
+import numpy as np  # Import numpy for zero-copy views of the offset and coordinate tables
+
+# File signature and header: magic, number of addresses, bytes of normalized keys
+MAGIC = b'FBGAZ001'
+HEADER = struct.Struct('<8sQQ')
+
+# Street types and directions folded to one spelling, so "Queen Street West" and "queen st w" match
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd',
+    'crescent': 'cres', 'court': 'crt', 'ct': 'crt', 'place': 'pl', 'lane': 'ln', 'square': 'sq',
+    'terrace': 'terr', 'parkway': 'pkwy', 'circle': 'cir', 'trail': 'trl', 'gardens': 'gdns',
+    'heights': 'hts', 'highway': 'hwy', 'grove': 'grv', 'gate': 'gt',
+    'west': 'w', 'east': 'e', 'north': 'n', 'south': 's',
+}
+
+_SEPARATORS = re.compile(r"[^\w]+")
+
+
+# Define the function to normalize an address into the form stored in the index
+def normalize_address(text):
+    words = _SEPARATORS.sub(' ', text.lower().replace("'", '')).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+# Define the function to read (address, lat, lon) rows from a CSV of address points
+def read_address_csv(path, address_column='address', lat_column='lat', lon_column='lon'):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        # Match column names case-insensitively, since extracts differ (ADDRESS_FULL, address, ...)
+        names = {name.lower(): name for name in reader.fieldnames or ()}
+        try:
+            address, lat, lon = (names[c.lower()] for c in (address_column, lat_column, lon_column))
+        except KeyError as e:
+            raise ValueError("{} has no column {}".format(path, e))
+        for row in reader:
+            try:
+                yield row[address].strip(), float(row[lat]), float(row[lon])
+            except (TypeError, ValueError):
+                continue  # Skip rows without usable coordinates
+
+
+# Define the function to write an index file from (address, lat, lon) rows
+def build_index(rows, path):
+    """Sort normalized addresses and write them with their labels and coordinates; returns the address count"""
+    entries = {}
+    for label, lat, lon in rows:
+        key = normalize_address(label).encode()
+        if key and key not in entries:  # The first point for an address wins
+            entries[key] = (label.encode(), lat, lon)
+    keys = sorted(entries)  # Byte order, which is the order lookups bisect in
+
+    key_offsets = np.zeros(len(keys) + 1, dtype='<u4')
+    label_offsets = np.zeros(len(keys) + 1, dtype='<u4')
+    key_offsets[1:] = np.cumsum([len(k) for k in keys])
+    label_offsets[1:] = np.cumsum([len(entries[k][0]) for k in keys])
+    coords = np.array([entries[k][1:] for k in keys], dtype='<f4').reshape(-1, 2)  # float32 is about 1 m here
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys), int(key_offsets[-1])))
+        f.write(key_offsets.tobytes())
+        f.write(label_offsets.tobytes())
+        f.write(coords.tobytes())
+        f.write(b''.join(keys))
+        f.write(b''.join(entries[k][0] for k in keys))
+    return len(keys)
+
+
+class Gazetteer:
+    """Read-only address index backed by a memory-mapped file written by build_index"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, key_bytes = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a gazetteer index".format(path))
+        self.count = count
+        # Offset and coordinate tables are views onto the mapping, not copies
+        offset = HEADER.size
+        self.key_offsets = np.frombuffer(self.mm, dtype='<u4', count=count + 1, offset=offset)
+        offset += 4 * (count + 1)
+        self.label_offsets = np.frombuffer(self.mm, dtype='<u4', count=count + 1, offset=offset)
+        offset += 4 * (count + 1)
+        self.coords = np.frombuffer(self.mm, dtype='<f4', count=2 * count, offset=offset).reshape(-1, 2)
+        self.keys_start = offset + 8 * count
+        self.labels_start = self.keys_start + key_bytes
+
+    def __len__(self):
+        return self.count
+
+    # Define the function to read the normalized key at a position
+    def _key(self, i):
+        start = self.keys_start + int(self.key_offsets[i])
+        return self.mm[start:self.keys_start + int(self.key_offsets[i + 1])]
+
+    # Define the function to read the display label at a position
+    def _label(self, i):
+        start = self.labels_start + int(self.label_offsets[i])
+        return self.mm[start:self.labels_start + int(self.label_offsets[i + 1])].decode()
+
+    # Define the function to find the first position whose key is not below a key
+    def _bisect(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # Define the function to resolve an address to (lat, lon)
+    def lookup(self, address):
+        """Return (lat, lon) for an exact normalized match, or for whole leading words of a single address
+        (e.g. "100 queen st" for "100 queen st w"); else None. Partly typed words are left to suggest()."""
+        key = normalize_address(address).encode()
+        if not key:
+            return None
+        i = self._bisect(key)
+        if i < self.count and self._key(i) == key:
+            return float(self.coords[i, 0]), float(self.coords[i, 1])
+        # A prefix must end at a word boundary ("12 king" is not "12 kingston rd") and name exactly one address
+        key += b' '
+        i = self._bisect(key)
+        if i == self.count or not self._key(i).startswith(key):
+            return None
+        if i + 1 < self.count and self._key(i + 1).startswith(key):
+            return None
+        return float(self.coords[i, 0]), float(self.coords[i, 1])
+
+    # Define the function to list addresses starting with what has been typed so far
+    def suggest(self, prefix, limit=8):
+        key = normalize_address(prefix).encode()
+        if not key:
+            return []
+        suggestions = []
+        i = self._bisect(key)
+        while i < self.count and len(suggestions) < limit and self._key(i).startswith(key):
+            suggestions.append(self._label(i))
+            i += 1
+        return suggestions
+
+    def close(self):
+        self.key_offsets = self.label_offsets = self.coords = None  # Release the views before unmapping
+        self.mm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build an index from a CSV of address points')
+    build.add_argument('csv', help='CSV with one row per address point')
+    build.add_argument('index', help='index file to write')
+    build.add_argument('--address', default='address', help='address column (default: address)')
+    build.add_argument('--lat', default='lat', help='latitude column (default: lat)')
+    build.add_argument('--lon', default='lon', help='longitude column (default: lon)')
+    for name in ('lookup', 'suggest'):
+        command = commands.add_parser(name, help='{} an address in an index'.format(name))
+        command.add_argument('index', help='index file')
+        command.add_argument('address', help='address or prefix')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        count = build_index(read_address_csv(args.csv, args.address, args.lat, args.lon), args.index)
+        print("Indexed {} addresses in {:.1f} s".format(count, time.perf_counter() - start))
+        return
+    gazetteer = Gazetteer(args.index)
+    start = time.perf_counter()
+    result = gazetteer.lookup(args.address) if args.command == 'lookup' else gazetteer.suggest(args.address)
+    elapsed = time.perf_counter() - start
+    print(result)
+    print("{:.1f} µs".format(elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
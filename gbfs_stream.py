@@ -0,0 +1,161 @@
+import io  # Import io to serialize columns in memory
+import re  # Import re to pick up the feed's last_updated field
+import json  # Import json to decode one array item at a time
+import codecs  # Import codecs for incremental UTF-8 decoding
+import datetime as dt  # Import datetime to read ISO-8601 timestamps
+import numpy as np  # Import numpy for typed column buffers
+
+# Top-level GBFS timestamp; item records use last_reported, so this only matches the header. v1/v2 feeds give
+# POSIX seconds, v3 feeds an RFC 3339 string such as "2024-03-01T12:00:00+00:00"
+LAST_UPDATED = re.compile(r'"last_updated"\s*:\s*(\d+|"[^"]*")\s*[,}]')  # Needs a terminator, so split digits never match
+
+# Fractional seconds, which datetime.fromisoformat only reads with exactly 3 or 6 digits before Python 3.11
+_FRACTION = re.compile(r'\.\d+')
+
+_decoder = json.JSONDecoder()
+
+
+# Define the function to convert a last_updated value (seconds or an RFC 3339 string) to POSIX seconds, or None
+def parse_timestamp(text):
+    text = text.strip('"')
+    if text.isdigit():
+        return int(text)
+    try:
+        when = dt.datetime.fromisoformat(_FRACTION.sub('', text.replace('Z', '+00:00').replace('z', '+00:00')))
+    except ValueError:
+        return None  # Not a timestamp this parser understands
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)  # GBFS times without an offset are taken as UTC
+    return int(when.timestamp())
+
+
+class FeedColumns:
+    """Typed, preallocated column buffers filled one feed item at a time"""
+
+    def __init__(self, columns, capacity):
+        self.columns = columns  # name -> (dtype, path, default)
+        self.size = 0
+        self.buffers = {}
+        for name, (dtype, _, _) in columns.items():
+            self.buffers[name] = [] if dtype == 'str' else np.empty(capacity, dtype=dtype)
+
+    # Define the function to copy one item's fields into the buffers, doubling them when full
+    def append(self, item):
+        i = self.size
+        for name, (dtype, path, default) in self.columns.items():
+            value = item
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is None:
+                value = default
+            buffer = self.buffers[name]
+            if dtype == 'str':
+                buffer.append(str(value))
+                continue
+            if i == len(buffer):
+                buffer = self.buffers[name] = np.resize(buffer, max(16, 2 * len(buffer)))
+            buffer[i] = value
+        self.size = i + 1
+
+    # Define the function to return the filled part of each buffer as numpy arrays
+    def finish(self):
+        arrays = {}
+        for name, (dtype, _, _) in self.columns.items():
+            buffer = self.buffers[name]
+            arrays[name] = np.array(buffer, dtype=str) if dtype == 'str' else buffer[:self.size].copy()
+        return arrays
+
+
+# Define the function to stream a GBFS document and return the items of one array as typed columns
+def parse_feed(stream, array_key, columns, capacity=1024, chunk_size=1 << 16):
+    """Read a GBFS JSON document from a binary stream without holding the whole body, its decoded text
+    or its object tree in memory. Items of the first array stored under `array_key` (e.g. "stations")
+    are decoded one at a time and copied into columns: {name: (dtype, path, default)}, where dtype is a
+    numpy dtype or 'str' and path is a tuple of keys into the item.
+
+    Returns (last_updated, {name: numpy array}).
+    """
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    out = FeedColumns(columns, capacity)
+    key_pattern = re.compile(r'"{}"\s*:\s*\['.format(re.escape(array_key)))
+    last_updated = None
+    buf = ''
+    pos = 0
+    eof = False
+
+    # Define the function to read the next chunk into the buffer, dropping text already consumed
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + decode(chunk, final=eof)
+        pos = 0
+
+    # Find the start of the array, noting last_updated if it comes first (it usually does)
+    while True:
+        match = key_pattern.search(buf)
+        if match is not None:
+            if last_updated is None:
+                found = LAST_UPDATED.search(buf, 0, match.start())
+                last_updated = parse_timestamp(found.group(1)) if found else None
+            pos = match.end()
+            break
+        if eof:
+            raise ValueError("GBFS document has no '{}' array".format(array_key))
+        # Keep a tail in case the key is split across chunks
+        found = LAST_UPDATED.search(buf)
+        if found and last_updated is None:
+            last_updated = parse_timestamp(found.group(1))
+        pos = max(0, len(buf) - 256)
+        fill()
+
+    # Decode the array's items one at a time
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("GBFS document ended inside the '{}' array".format(array_key))
+            fill()
+            continue
+        if buf[pos] == ']':
+            pos += 1
+            break
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()  # The item continues in the next chunk
+            continue
+        out.append(item)
+        pos = end
+
+    # last_updated may also follow the data object
+    while last_updated is None:
+        found = LAST_UPDATED.search(buf, pos)
+        if found:
+            last_updated = parse_timestamp(found.group(1))
+            pos = found.end()  # Keep looking if the value was not a timestamp
+        elif eof:
+            break
+        else:
+            pos = max(pos, len(buf) - 256)
+            fill()
+    return last_updated, out.finish()
+
+
+# Define the function to serialize parsed columns compactly (no pickling) for the shared cache
+def dump_columns(last_updated, arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, _last_updated=np.array(-1 if last_updated is None else last_updated), **arrays)
+    return buffer.getvalue()
+
+
+# Define the function to load columns written by dump_columns
+def load_columns(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    last_updated = int(arrays.pop('_last_updated'))
+    return (None if last_updated < 0 else last_updated), arrays
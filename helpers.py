@@ -1,38 +1,162 @@
 import urllib  # Import module for working with URLs
-import json  # Import module for working with JSON data
 import pandas as pd  # Import pandas for data manipulation
+import numpy as np  # Import numpy for vectorized distance calculations
 import folium  # Import folium for creating interactive maps
-import datetime as dt  # Import datetime for working with dates and times
-from geopy.distance import geodesic  # Import geodesic for calculating distances
+import threading  # Import threading to guard caches shared by sessions
+import time  # Import time to version feeds without a timestamp
 from geopy.geocoders import Nominatim  # Import Nominatim for geocoding
 import streamlit as st  # Import Streamlit for creating web apps
+from routing import StreetGraph, PROFILE_SPEEDS  # Import the local street graph routing engine
+from resilience import Upstream, CircuitBreaker, UpstreamError  # Import the upstream resilience layer
+from config import (  # Import settings for routing, upstreams, caches, feeds and the address index
+    ROUTING_BACKEND, ROUTING_GRAPH_PATH, OSRM_URL, OSRM_PROFILES, UPSTREAM_TIMEOUT, UPSTREAM_WORKERS, BREAKER_FAILURES, BREAKER_RESET,
+    GBFS_FRESH_SECONDS, GBFS_STALE_SECONDS, SHARED_CACHE_URL, NOMINATIM_DOMAIN, NOMINATIM_SCHEME, SNAPSHOT_BUDGET_MB,
+    GBFS_FREE_VEHICLES_URL, GBFS_VEHICLE_TYPES_URL, VEHICLES_FRESH_SECONDS, GAZETTEER_PATH, GAZETTEER_CITY,
+)
+from shared_cache import SharedCache, open_cache  # Import the cross-replica shared cache
+from snapshots import SnapshotStore  # Import the per-process snapshot store
+from gbfs_stream import parse_feed, dump_columns, load_columns  # Import the streaming GBFS parser
+from gazetteer import Gazetteer  # Import the local address index
+from station_diff import diff_stations  # Import the snapshot change detection
+from dockless import VehicleStore, vehicle_columns, ebike_type_ids, VEHICLE_TYPE_COLUMNS  # Import the free vehicle store
+
+# Derived DataFrames share memory with their parent until written to, so sessions can't alter shared snapshots
+pd.set_option('mode.copy_on_write', True)
+
+# Define the function to create a resilient wrapper for one upstream service
+def make_upstream(name, fresh_for, stale_for, max_entries=1024):
+    return Upstream(name, timeout=UPSTREAM_TIMEOUT, fresh_for=fresh_for, stale_for=stale_for, max_entries=max_entries,
+                    breaker=CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET), workers=UPSTREAM_WORKERS)
+
+# One wrapper per upstream, shared by every session in this process
+gbfs_upstream = make_upstream("GBFS", GBFS_FRESH_SECONDS, GBFS_STALE_SECONDS, max_entries=16)
+geocode_upstream = make_upstream("Nominatim", 24 * 3600, 7 * 24 * 3600, max_entries=4096)
+osrm_upstream = make_upstream("OSRM", 3600, 24 * 3600, max_entries=4096)
+vehicles_upstream = make_upstream("GBFS vehicles", VEHICLES_FRESH_SECONDS, 5 * 60, max_entries=4)
+
+# Cache shared with the other replicas, consulted before any upstream is called
+shared_cache = SharedCache(open_cache(SHARED_CACHE_URL))
+
+# Station snapshots, held once and shared by every session in this process
+snapshot_store = SnapshotStore(int(SNAPSHOT_BUDGET_MB * 2 ** 20))
+
+# Local street graph, loaded at startup and shared by every session in this process
+street_graph = StreetGraph.open(ROUTING_GRAPH_PATH) if ROUTING_BACKEND == 'local' else None
+
+# Station changes between snapshot versions, as {(old version, new version): diff}, shared by every session
+station_diffs = {}
+station_diffs_lock = threading.Lock()
+
+# Free vehicle stores by feed URL, as (last_updated, VehicleStore)
+vehicle_stores = {}
+
+# Define the function to open the local address index, if one is configured
+def open_gazetteer(path):
+    if not path:
+        return None
+    try:
+        return Gazetteer(path)
+    except (OSError, ValueError) as e:
+        print("Address index unavailable, using Nominatim only:", e)
+        return None
+
+# Local address index, memory-mapped once and shared by every session in this process
+gazetteer = open_gazetteer(GAZETTEER_PATH)
+
+# Columns kept from each GBFS feed: name -> (dtype, path within each record, default when missing)
+STATION_STATUS_COLUMNS = {
+    'station_id': ('str', ('station_id',), ''),
+    'num_bikes_available': ('int32', ('num_bikes_available',), 0),
+    'num_bikes_disabled': ('int32', ('num_bikes_disabled',), 0),
+    'num_docks_available': ('int32', ('num_docks_available',), 0),
+    'num_docks_disabled': ('int32', ('num_docks_disabled',), 0),
+    'last_reported': ('int64', ('last_reported',), 0),
+    'is_installed': ('int8', ('is_installed',), 0),
+    'is_renting': ('int8', ('is_renting',), 0),
+    'is_returning': ('int8', ('is_returning',), 0),
+    'ebike': ('int32', ('num_bikes_available_types', 'ebike'), 0),
+    'mechanical': ('int32', ('num_bikes_available_types', 'mechanical'), 0),
+}
+STATION_INFORMATION_COLUMNS = {
+    'station_id': ('str', ('station_id',), ''),
+    'name': ('str', ('name',), ''),
+    'lat': ('float64', ('lat',), np.nan),
+    'lon': ('float64', ('lon',), np.nan),
+    'capacity': ('int32', ('capacity',), 0),
+}
+
+# Define the function to fetch a GBFS feed and return (last_updated, {column: numpy array})
+def fetch_feed(url, array_key, columns, upstream=None, ttl=GBFS_FRESH_SECONDS):
+    def download():
+        with urllib.request.urlopen(url, timeout=UPSTREAM_TIMEOUT) as data_url:  # Open the URL
+            length = int(data_url.headers.get('Content-Length') or 0)
+            capacity = max(16, length // 200)  # Rough record count, so buffers rarely need to grow
+            # Stream the body straight into typed columns instead of reading and decoding it whole
+            last_updated, arrays = parse_feed(data_url, array_key, columns, capacity=capacity)
+        if last_updated is None:
+            last_updated = int(time.time())  # No usable timestamp in the feed; version it by when it was fetched
+        return dump_columns(last_updated, arrays)  # Compact form stored in the shared cache
+    def fetch():
+        # One elected replica downloads the feed; the others read its copy
+        body = shared_cache.get_or_fetch('gbfs-columns:' + url, download, ttl=ttl, elect=True, wait=UPSTREAM_TIMEOUT)
+        return load_columns(body)
+    return (upstream or gbfs_upstream).call(url, fetch)  # Serve fresh or stale data, refreshing at most once at a time
 
-@st.cache_data  # Cache the function's output to improve performance
 # Define the function to query station status from a given URL
 def query_station_status(url):
-    with urllib.request.urlopen(url) as data_url:  # Open the URL
-        data = json.loads(data_url.read().decode())  # Read and decode the JSON data
+    return build_station_status(fetch_feed(url, 'stations', STATION_STATUS_COLUMNS))  # Fetch the feed and build the DataFrame
 
-    df = pd.DataFrame(data['data']['stations'])  # Convert the data to a DataFrame
+# Define the function to build the station status DataFrame from parsed station_status columns
+def build_station_status(feed):
+    last_updated, columns = feed
+    df = pd.DataFrame(columns)  # Convert the columns to a DataFrame
     df = df[df.is_renting == 1]  # Filter out stations that are not renting
     df = df[df.is_returning == 1]  # Filter out stations that are not returning
     df = df.drop_duplicates(['station_id', 'last_reported'])  # Remove duplicate records
-    df.last_reported = df.last_reported.map(lambda x: dt.datetime.utcfromtimestamp(x))  # Convert timestamps to datetime
-    df['time'] = data['last_updated']  # Add the last updated time to the DataFrame
-    df.time = df.time.map(lambda x: dt.datetime.utcfromtimestamp(x))  # Convert timestamps to datetime
+    df['last_reported'] = pd.to_datetime(df['last_reported'], unit='s')  # Convert timestamps to datetime
+    df['time'] = pd.Timestamp(last_updated, unit='s', tz='UTC')  # Add the last updated time to the DataFrame
     df = df.set_index('time')  # Set the time as the index
-    df.index = df.index.tz_localize('UTC')  # Localize the index to UTC
-    df = pd.concat([df, df['num_bikes_available_types'].apply(pd.Series)], axis=1)  # Expand the bike types column
 
     return df  # Return the DataFrame
 
 # Define the function to get station latitude and longitude from a given URL
 def get_station_latlon(url):
-    with urllib.request.urlopen(url) as data_url:  # Open the URL
-        latlon = json.loads(data_url.read().decode())  # Read and decode the JSON data
-    latlon = pd.DataFrame(latlon['data']['stations'])  # Convert the data to a DataFrame
+    _, columns = fetch_feed(url, 'stations', STATION_INFORMATION_COLUMNS)  # Fetch the feed
+    latlon = pd.DataFrame(columns)  # Convert the columns to a DataFrame
     return latlon  # Return the DataFrame
 
+# Define the function to get the joined status and location snapshot for the current feed version
+def get_station_snapshot(status_url, latlon_url):
+    """Return a session-private shallow view of the shared snapshot; copy-on-write protects the original"""
+    _, frame = get_station_version(status_url, latlon_url)
+    return frame.copy(deep=False)  # No data is copied until the session modifies its view
+
+# Define the function to get the current snapshot version and the shared snapshot itself
+def get_station_version(status_url, latlon_url):
+    status = fetch_feed(status_url, 'stations', STATION_STATUS_COLUMNS)  # Fetch the station status data
+    latlon = fetch_feed(latlon_url, 'stations', STATION_INFORMATION_COLUMNS)  # Fetch the station location data
+    key = (status_url, status[0], latlon_url, latlon[0])  # One snapshot per feed version
+    build = lambda: join_latlon(build_station_status(status), pd.DataFrame(latlon[1]))
+    return key, snapshot_store.get_or_build(key, build)
+
+# Define the function to get the station changes since a snapshot version a client already has
+def get_station_update(status_url, latlon_url, since=None):
+    """Return (version, snapshot, diff); diff is None when `since` is unknown or no longer held, so the client needs everything"""
+    key, frame = get_station_version(status_url, latlon_url)
+    base = None if since is None else snapshot_store.get(since)
+    if base is None:
+        return key, frame, None
+    if since == key:
+        return key, frame, {'upsert': [], 'remove': []}
+    diff = station_diffs.get((since, key))
+    if diff is None:
+        diff = diff_stations(base, frame)  # Computed once, then shared
+        with station_diffs_lock:
+            station_diffs[(since, key)] = diff
+            while len(station_diffs) > 64:
+                station_diffs.pop(next(iter(station_diffs)))  # Drop the oldest
+    return key, frame, diff
+
 # Define the function to join two DataFrames on station_id
 def join_latlon(df1, df2):
     df = df1.merge(df2[['station_id', 'lat', 'lon']], 
@@ -49,76 +173,244 @@ def get_marker_color(num_bikes_available):
     else:
         return 'red'
 
+# Returned by geocode() and locate() when the geocoder could not be asked, as opposed to '' for an unknown address
+GEOCODER_UNAVAILABLE = None
+
 # Define the function to geocode an address
 def geocode(address):
-    geolocator = Nominatim(user_agent="clicked-demo")  # Create a geolocator object
-    location = geolocator.geocode(address)  # Geocode the address
+    def lookup():
+        geolocator = Nominatim(user_agent="clicked-demo", timeout=UPSTREAM_TIMEOUT,
+                                domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)  # Create a geolocator object
+        location = geolocator.geocode(address)  # Geocode the address
+        return None if location is None else [location.latitude, location.longitude]
+    def fetch():
+        return shared_cache.get_or_fetch_json('geocode:' + address, lookup, ttl=7 * 24 * 3600)
+    try:
+        location = geocode_upstream.call(address, fetch)
+    except UpstreamError as e:
+        print("Geocoding unavailable:", e)
+        return GEOCODER_UNAVAILABLE  # Not the same as an unknown address; the user should try again later
     if location is None:
         return ''  # Return an empty string if the address is not found
     else:
-        return (location.latitude, location.longitude)  # Return the latitude and longitude
+        return (location[0], location[1])  # Return the latitude and longitude
+
+# Define the function to geocode a street address, trying the local address index before Nominatim
+def locate(street, city, country):
+    if gazetteer is not None and city.strip().lower() == GAZETTEER_CITY.lower():
+        location = gazetteer.lookup(street)
+        if location is not None:
+            return location  # Resolved without leaving the process
+    return geocode(street + " " + city + " " + country)
+
+# Define the function to suggest known addresses starting with what has been typed
+def suggest_addresses(street, city, limit=8):
+    if gazetteer is None or street == "" or city.strip().lower() != GAZETTEER_CITY.lower():
+        return []
+    suggestions = gazetteer.suggest(street, limit)
+    if len(suggestions) == 1 and gazetteer.lookup(street) is not None:
+        return []  # Already names the one address it could complete to
+    return suggestions
 
 # Define the function to get bike availability near a location
 def get_bike_availability(latlon, df, input_bike_modes):
     """Calculate distance from each station to the user and return a single station id, lat, lon"""
     if len(input_bike_modes) == 0 or len(input_bike_modes) == 2:  # If no mode selected, assume both bikes are selected
-        i = 0
-        df['distance'] = ''
-        while i < len(df):
-            df.loc[i, 'distance'] = geodesic(latlon, (df['lat'][i], df['lon'][i])).km  # Calculate distance to each station
-            i = i + 1
-        df = df.loc[(df['ebike'] > 0) | (df['mechanical'] > 0)]  # Remove stations with no available bikes
-        chosen_station = []
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['station_id'].iloc[0])  # Get closest station
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['lat'].iloc[0])
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['lon'].iloc[0])
+        has_bike = (df['ebike'] > 0) | (df['mechanical'] > 0)  # Stations with any bike available
     else:
-        i = 0
-        df['distance'] = ''
-        while i < len(df):
-            df.loc[i, 'distance'] = geodesic(latlon, (df['lat'][i], df['lon'][i])).km  # Calculate distance to each station
-            i = i + 1
-        df = df.loc[df[input_bike_modes[0]] > 0]  # Remove stations without the selected mode available
-        chosen_station = []
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['station_id'].iloc[0])  # Get closest station
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['lat'].iloc[0])
-        chosen_station.append(df[df['distance'] == min(df['distance'])]['lon'].iloc[0])
-    return chosen_station  # Return the chosen station
+        has_bike = df[input_bike_modes[0]] > 0  # Stations with the selected mode available
+    return get_nearest_station(latlon, df, has_bike)  # Return the chosen station
 
 # Define the function to get dock availability near a location
 def get_dock_availability(latlon, df):
     """Calculate distance from each station to the user and return a single station id, lat, lon"""
-    i = 0
-    df['distance'] = ''
-    while i < len(df):
-        df.loc[i, 'distance'] = geodesic(latlon, (df['lat'][i], df['lon'][i])).km  # Calculate distance to each station
-        i = i + 1
-    df = df.loc[df['num_docks_available'] > 0]  # Remove stations without available docks
-    chosen_station = []
-    chosen_station.append(df[df['distance'] == min(df['distance'])]['station_id'].iloc[0])  # Get closest station
-    chosen_station.append(df[df['distance'] == min(df['distance'])]['lat'].iloc[0])
-    chosen_station.append(df[df['distance'] == min(df['distance'])]['lon'].iloc[0])
-    return chosen_station  # Return the chosen station
+    return get_nearest_station(latlon, df, df['num_docks_available'] > 0)  # Return the chosen station
+
+# Define the function to get the closest station matching a mask, with one vectorized distance pass
+def get_nearest_station(latlon, df, mask):
+    """Return [station_id, lat, lon] of the closest matching station, or None when no station matches"""
+    nearest = nearest_stations(latlon, df, mask & df['lat'].notna(), 1)  # Skip stations without a known location
+    if nearest.empty:
+        return None  # e.g. no station has a bike or dock free right now
+    closest = nearest.iloc[0]
+    return [closest['station_id'], closest['lat'], closest['lon']]
+
+# Define the function to get the store of rentable free-floating vehicles, rebuilt whenever the feed changes
+def get_vehicle_store():
+    if not GBFS_FREE_VEHICLES_URL:
+        return None  # No dockless feed configured
+    array_key = 'vehicles' if 'vehicle_status' in GBFS_FREE_VEHICLES_URL else 'bikes'
+    last_updated, columns = fetch_feed(GBFS_FREE_VEHICLES_URL, array_key, vehicle_columns(array_key),
+                                       upstream=vehicles_upstream, ttl=VEHICLES_FRESH_SECONDS)
+    cached = vehicle_stores.get(GBFS_FREE_VEHICLES_URL)
+    if cached is not None and last_updated is not None and cached[0] == last_updated:  # An unversioned feed is never reused
+        return cached[1]
+    ebike_types = None
+    if GBFS_VEHICLE_TYPES_URL:
+        _, types = fetch_feed(GBFS_VEHICLE_TYPES_URL, 'vehicle_types', VEHICLE_TYPE_COLUMNS)
+        ebike_types = ebike_type_ids(types)
+    store = VehicleStore(columns, ebike_types)  # Rebuild the arrays and spatial index for the new snapshot
+    vehicle_stores[GBFS_FREE_VEHICLES_URL] = (last_updated, store)
+    return store
+
+# Define the function to find the nearest free-floating vehicle of the requested type
+def get_free_vehicle_availability(latlon, input_bike_modes, max_km=1.0):
+    """Return [vehicle_id, lat, lon, distance_km] for the nearest rentable vehicle, or None"""
+    if input_bike_modes == ['mechanical']:
+        return None  # Dockless vehicles are only offered as e-bikes
+    try:
+        store = get_vehicle_store()
+    except UpstreamError as e:
+        print("Free vehicle feed unavailable:", e)
+        return None  # Fall back to stations only
+    if store is None:
+        return None
+    return store.nearest(latlon, ebike_only=True, max_km=max_km)
 
 import requests  # Import requests for making HTTP requests
 
+# Define the function to call an OSRM URL through the resilience layer and return its JSON
+def fetch_osrm(url):
+    def request():
+        headers = {'Content-type': 'application/json'}
+        r = requests.get(url, headers=headers, timeout=UPSTREAM_TIMEOUT)  # Make the API request
+        print("Calling API ...:", r.status_code)  # Print the status code
+        r.raise_for_status()  # Count HTTP errors against the circuit breaker
+        return r.json()
+    def fetch():
+        return shared_cache.get_or_fetch_json('osrm:' + url, request, ttl=24 * 3600)
+    return osrm_upstream.call(url, fetch)
+
 # Define the function to run OSRM and get route coordinates and duration
-def run_osrm(chosen_station, iamhere):
+def run_osrm(chosen_station, iamhere, profile='driving'):
     start = "{},{}".format(iamhere[1], iamhere[0])  # Format the start coordinates
     end = "{},{}".format(chosen_station[2], chosen_station[1])  # Format the end coordinates
-    url = 'http://router.project-osrm.org/route/v1/driving/{};{}?geometries=geojson'.format(start, end)  # Create the OSRM API URL
+    url = '{}/route/v1/{}/{};{}?geometries=geojson'.format(OSRM_URL, profile, start, end)  # Create the OSRM API URL
 
-    headers = {'Content-type': 'application/json'}
-    r = requests.get(url, headers=headers)  # Make the API request
-    print("Calling API ...:", r.status_code)  # Print the status code
-
-    routejson = r.json()  # Parse the JSON response
+    routejson = fetch_osrm(url)  # Parse the JSON response
     coordinates = []
     i = 0
     lst = routejson['routes'][0]['geometry']['coordinates']
     while i < len(lst):
         coordinates.append([lst[i][1], lst[i][0]])  # Extract coordinates
         i = i + 1
-    duration = round(routejson['routes'][0]['duration'] / 60, 1)  # Convert duration to minutes
+    if profile in OSRM_PROFILES or profile not in PROFILE_SPEEDS:
+        duration = round(routejson['routes'][0]['duration'] / 60, 1)  # Convert duration to minutes
+    else:
+        duration = osrm_minutes(routejson['routes'][0]['distance'], profile)  # The server routed another profile
+
+    return coordinates, duration  # Return the coordinates and duration
+
+# Define the function to get a route from the configured routing backend
+def get_route(chosen_station, iamhere, profile='foot'):
+    """Return route coordinates and duration in minutes, like run_osrm, from the configured backend"""
+    if ROUTING_BACKEND == 'local' and profile in ('foot', 'bike'):
+        try:
+            return street_graph.route(iamhere, (chosen_station[1], chosen_station[2]), profile)
+        except ValueError as e:
+            print("No route on the street graph, using straight line:", e)
+            return straight_line_route(chosen_station, iamhere, profile)
+    try:
+        return run_osrm(chosen_station, iamhere, profile)  # Fall back to the OSRM server
+    except UpstreamError as e:
+        print("Routing unavailable, using straight line:", e)
+        return straight_line_route(chosen_station, iamhere, profile)
+
+# Define the function to get a straight-line route and estimated duration when no router can answer
+def straight_line_route(chosen_station, iamhere, profile):
+    end = (chosen_station[1], chosen_station[2])
+    duration = estimate_minutes(haversine_km(iamhere, [end[0]], [end[1]])[0], profile)
+    return [list(iamhere), list(end)], duration
+
+# Define the function to run the OSRM table service and get a matrix of durations in minutes
+def run_osrm_table(sources, destinations, profile='foot'):
+    points = list(sources) + list(destinations)
+    coords = ";".join("{},{}".format(p[1], p[0]) for p in points)  # OSRM expects lon,lat
+    src = ";".join(str(i) for i in range(len(sources)))
+    dst = ";".join(str(i) for i in range(len(sources), len(points)))
+    url = '{}/table/v1/{}/{}?sources={}&destinations={}'.format(OSRM_URL, profile, coords, src, dst)  # Create the OSRM API URL
+
+    if profile in OSRM_PROFILES or profile not in PROFILE_SPEEDS:
+        durations = fetch_osrm(url)['durations']  # Seconds, with None for unreachable pairs
+        return [[float('inf') if d is None else round(d / 60, 1) for d in row] for row in durations]
+    distances = fetch_osrm(url + '&annotations=distance')['distances']  # The server routes another profile; use metres
+    return [[float('inf') if d is None else osrm_minutes(d, profile) for d in row] for row in distances]
+
+# Define the function to convert metres routed by OSRM into minutes at a profile's own speed
+def osrm_minutes(metres, profile):
+    return round(metres / (PROFILE_SPEEDS[profile] * 1000 / 60), 1)
+
+# Define the function to get a duration matrix from the configured routing backend
+def get_duration_matrix(sources, destinations, profile='foot'):
+    try:
+        if ROUTING_BACKEND == 'local' and profile in ('foot', 'bike'):
+            matrix = street_graph.duration_matrix(sources, destinations, profile)
+        else:
+            matrix = run_osrm_table(sources, destinations, profile)
+    except (UpstreamError, ValueError) as e:
+        print("Routing unavailable, using straight-line estimates:", e)
+        matrix = [[float('inf')] * len(destinations) for _ in sources]
+    # Pairs the router could not connect (off the graph, unreachable or unavailable) get a straight-line estimate
+    lats, lons = [d[0] for d in destinations], [d[1] for d in destinations]
+    return [[minutes if np.isfinite(minutes) else estimate_minutes(km, profile)
+             for minutes, km in zip(row, haversine_km(src, lats, lons))]
+            for row, src in zip(matrix, sources)]
+
+# Define the function to estimate travel minutes over a straight-line distance when no router answers
+def estimate_minutes(km, profile):
+    speed = PROFILE_SPEEDS.get(profile, 30.0)  # km/h; driving falls back to a city average
+    return round(float(km) * 1.3 / speed * 60, 1)  # Streets are roughly 30% longer than the crow flies
+
+# Define the function to calculate distances in km from one point to arrays of latitudes and longitudes
+def haversine_km(latlon, lats, lons):
+    lat1, lon1 = np.radians(latlon[0]), np.radians(latlon[1])
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+# Define the function to pick the k stations nearest to a location among those matching a mask
+def nearest_stations(latlon, df, mask, k):
+    candidates = df.loc[mask.values]
+    distance = haversine_km(latlon, candidates['lat'], candidates['lon'])
+    k = min(k, len(candidates))
+    order = np.argsort(distance)[:k]  # Closest first
+    return candidates.iloc[order]
+
+# Define the function to plan a trip: walk to a bike, ride it, dock it and walk to the destination
+def plan_trip(origin, destination, df, input_bike_modes, candidates=12):
+    """Pick the pickup/drop-off station pair with the lowest walk + ride + walk time"""
+    if len(input_bike_modes) == 0 or len(input_bike_modes) == 2:  # If no mode selected, assume both bikes are selected
+        has_bike = (df['ebike'] > 0) | (df['mechanical'] > 0)
+    else:
+        has_bike = df[input_bike_modes[0]] > 0
+    located = df['lat'].notna() & df['lon'].notna()  # Skip stations without a known location
+    pickups = nearest_stations(origin, df, has_bike & located, candidates)
+    dropoffs = nearest_stations(destination, df, (df['num_docks_available'] > 0) & located, candidates)
+    if len(pickups) == 0 or len(dropoffs) == 0:
+        return None  # No station can serve this trip
+
+    pickup_points = list(zip(pickups['lat'], pickups['lon']))
+    dropoff_points = list(zip(dropoffs['lat'], dropoffs['lon']))
+
+    # One batched matrix per leg instead of a route call per station pair
+    walk_to = np.array(get_duration_matrix([origin], pickup_points, 'foot'))[0]
+    ride = np.array(get_duration_matrix(pickup_points, dropoff_points, 'bike'))
+    walk_from = np.array(get_duration_matrix(dropoff_points, [destination], 'foot'))[:, 0]
+
+    total = walk_to[:, None] + ride + walk_from[None, :]  # Total time for every (pickup, drop-off) pair
+    same = pickups['station_id'].values[:, None] == dropoffs['station_id'].values[None, :]
+    total[same] = np.inf  # Docking where you picked up is not a trip
+    if not np.isfinite(total).any():
+        return None
+    i, j = np.unravel_index(np.argmin(total), total.shape)
 
-    return coordinates, duration  # Return the coordinates and duration
\ No newline at end of file
+    pickup = pickups.iloc[i]
+    dropoff = dropoffs.iloc[j]
+    return {
+        'pickup': [pickup['station_id'], pickup['lat'], pickup['lon']],
+        'dropoff': [dropoff['station_id'], dropoff['lat'], dropoff['lon']],
+        'walk_to': float(walk_to[i]),
+        'ride': float(ride[i, j]),
+        'walk_from': float(walk_from[j]),
+        'total': round(float(total[i, j]), 1),
+    }
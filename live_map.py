@@ -0,0 +1,41 @@
+import os  # Import os for the component's file location
+import streamlit as st  # Import Streamlit for session state
+import streamlit.components.v1 as components  # Import components to serve the map frontend
+from station_diff import station_rows  # Import the station row encoding shared with the diffs
+
+# Leaflet map served from static/live_map; it keeps its markers and applies updates to them in place
+_component = components.declare_component(
+    "live_map", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "live_map")
+)
+
+
+# Define the function to label a snapshot version for the browser
+def version_label(version):
+    return None if version is None else "{}:{}".format(version[1], version[3])
+
+
+# Define the function to draw the live station map, sending only what changed since this session's last update
+def live_map(get_update, center, zoom=13, height=500, key="live_map"):
+    """get_update(since) returns (version, snapshot, diff) as helpers.get_station_update does"""
+    sent_key = key + "_sent"
+    resync_key = key + "_resync"
+    since = st.session_state.get(sent_key)
+    # The browser asks for everything again when it lost its markers (e.g. the map was reloaded)
+    reply = st.session_state.get(key) or {}
+    if reply.get('resync') is not None and reply.get('resync') != st.session_state.get(resync_key):
+        st.session_state[resync_key] = reply['resync']
+        since = None
+
+    version, frame, diff = get_update(since)
+    update = {'version': version_label(version), 'base': version_label(since)}
+    if diff is None:
+        update['stations'] = station_rows(frame)
+    else:
+        update.update(diff)
+    st.session_state[sent_key] = version
+    _component(update=update, center=center, zoom=zoom, height=height, key=key, default=None)
+
+
+# Define the function to note that the live map is not on the page, so its next appearance starts from scratch
+def forget_live_map(key="live_map"):
+    st.session_state.pop(key + "_sent", None)
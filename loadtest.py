@@ -0,0 +1,328 @@
+"""Concurrent-session load test for app.py against local stand-ins for GBFS, Nominatim and OSRM.
+
+Example:
+    python loadtest.py --sessions 20 --concurrency 10 --latency gbfs=0.05,nominatim=0.3,osrm=0.2
+"""
+import os  # Import os for environment variables and memory readings
+import sys  # Import sys for the platform check
+import json  # Import json for stub responses and the report
+import math  # Import math for synthetic distances
+import time  # Import time for measuring reruns
+import random  # Import random for synthetic station data
+import hashlib  # Import hashlib for deterministic fake geocodes
+import argparse  # Import argparse for the command line interface
+import tempfile  # Import tempfile for an isolated shared cache file
+import threading  # Import threading for the stub server
+from urllib.parse import urlsplit, parse_qs  # Import URL parsing for stub routing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Import the stub HTTP server
+from concurrent.futures import ThreadPoolExecutor  # Import executor to run sessions concurrently
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Downtown Toronto box used for synthetic stations and geocodes
+BOUNDS = (43.630, 43.680, -79.430, -79.340)
+
+ADDRESSES = ["100 Queen Street West", "1 Blue Jays Way", "290 Bremner Boulevard", "60 Spadina Avenue",
+             "220 Yonge Street", "1 Dundas Street West", "55 Mill Street", "317 Dundas Street West"]
+
+
+# Define the function to build synthetic GBFS station_status and station_information feeds
+def make_feeds(num_stations, seed=0):
+    rng = random.Random(seed)
+    now = int(time.time())
+    status, info = [], []
+    for i in range(num_stations):
+        station_id = str(7000 + i)
+        ebike = rng.randint(0, 4)
+        mechanical = rng.randint(0, 12)
+        capacity = ebike + mechanical + rng.randint(0, 15)
+        status.append({
+            'station_id': station_id, 'num_bikes_available': ebike + mechanical,
+            'num_bikes_available_types': {'mechanical': mechanical, 'ebike': ebike},
+            'num_bikes_disabled': 0, 'num_docks_available': capacity - ebike - mechanical, 'num_docks_disabled': 0,
+            'last_reported': now - rng.randint(0, 600), 'is_charging_station': False, 'status': 'IN_SERVICE',
+            'is_installed': 1, 'is_renting': 1, 'is_returning': 1,
+        })
+        info.append({
+            'station_id': station_id, 'name': 'Station {}'.format(station_id),
+            'lat': rng.uniform(BOUNDS[0], BOUNDS[1]), 'lon': rng.uniform(BOUNDS[2], BOUNDS[3]), 'capacity': capacity,
+        })
+    feed = lambda stations: json.dumps({'last_updated': now, 'ttl': 10, 'data': {'stations': stations}}).encode()
+    return feed(status), feed(info)
+
+
+# Define the function to map an address to a stable point inside the downtown box
+def fake_geocode(query):
+    h = hashlib.sha1(query.encode()).digest()
+    lat = BOUNDS[0] + (BOUNDS[1] - BOUNDS[0]) * h[0] / 255
+    lon = BOUNDS[2] + (BOUNDS[3] - BOUNDS[2]) * h[1] / 255
+    return lat, lon
+
+
+# Define the function to estimate a stub route duration in seconds between two lon,lat pairs
+def fake_seconds(a, b, profile):
+    dx = (a[0] - b[0]) * 111000 * math.cos(math.radians(a[1]))
+    dy = (a[1] - b[1]) * 111000
+    speed = {'foot': 1.4, 'bike': 4.2}.get(profile, 8.0)  # m/s
+    return math.hypot(dx, dy) * 1.3 / speed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers GBFS, Nominatim /search and OSRM /route and /table requests with synthetic data"""
+
+    feeds = {}
+    latency = {}
+
+    def log_message(self, *args):
+        pass  # Keep the report readable
+
+    def _send(self, body, upstream):
+        time.sleep(self.latency.get(upstream, 0.0))  # Simulated upstream latency
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)  # urlsplit, since OSRM paths contain ";"
+        parts = url.path.strip('/').split('/')
+        if parts[0] == 'gbfs':
+            self._send(self.feeds[parts[-1]], 'gbfs')
+        elif parts[0] == 'search':
+            lat, lon = fake_geocode(parse_qs(url.query).get('q', [''])[0])
+            self._send(json.dumps([{'lat': str(lat), 'lon': str(lon), 'display_name': 'Stub'}]).encode(), 'nominatim')
+        elif parts[0] in ('route', 'table'):
+            profile = parts[2]
+            points = [tuple(float(v) for v in p.split(',')) for p in parts[3].split(';')]
+            if parts[0] == 'route':
+                body = {'routes': [{'geometry': {'coordinates': [list(p) for p in points]},
+                                    'duration': fake_seconds(points[0], points[-1], profile)}]}
+            else:
+                query = parse_qs(url.query)
+                sources = [int(i) for i in query['sources'][0].split(';')]
+                destinations = [int(i) for i in query['destinations'][0].split(';')]
+                body = {'durations': [[fake_seconds(points[s], points[d], profile) for d in destinations] for s in sources]}
+            self._send(json.dumps(body).encode(), 'osrm')
+        else:
+            self.send_error(404)
+
+
+# Define the function to start the stub server in a background thread
+def start_stubs(num_stations, latency):
+    status, info = make_feeds(num_stations)
+    StubHandler.feeds = {'station_status': status, 'station_information': info}
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Define the function to point the app's upstream configuration at the stub server
+def configure_app(port, shared_cache):
+    base = 'http://127.0.0.1:{}'.format(port)
+    os.environ['FINDBIKE_GBFS_STATION_STATUS_URL'] = base + '/gbfs/station_status'
+    os.environ['FINDBIKE_GBFS_STATION_INFORMATION_URL'] = base + '/gbfs/station_information'
+    os.environ['FINDBIKE_NOMINATIM_DOMAIN'] = '127.0.0.1:{}'.format(port)
+    os.environ['FINDBIKE_NOMINATIM_SCHEME'] = 'http'
+    os.environ['FINDBIKE_OSRM_URL'] = base
+    os.environ['FINDBIKE_OSRM_PROFILES'] = 'driving,foot,bike'  # The stub times every profile at its own speed
+    os.environ['FINDBIKE_ROUTING_BACKEND'] = 'osrm'
+    os.environ['FINDBIKE_SHARED_CACHE'] = shared_cache
+
+
+# Define the function to read this process's resident memory in MB
+def rss_mb():
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    import resource  # Fallback: peak rather than current RSS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+# Define the function to give every AppTest session one shared runtime, as a real server process has
+def share_test_runtime():
+    """AppTest installs and removes a global mock Runtime around each run, which breaks concurrent sessions"""
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)  # Ignore AppTest's per-run install/teardown
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+# Define the function to drive one simulated user through a realistic flow, timing every rerun
+def run_session(index, flow, timeout):
+    from streamlit.testing.v1 import AppTest  # Imported late so the upstream configuration is already set
+
+    timings = []
+    errors = 0
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def rerun(step, action):
+        nonlocal errors
+        start = time.perf_counter()
+        action()
+        timings.append((step, time.perf_counter() - start))
+        if at.exception or at.error:
+            errors += 1  # Raised, or shown to the user with st.error (e.g. an address that could not be geocoded)
+
+    address = ADDRESSES[index % len(ADDRESSES)]
+    try:
+        rerun('open', at.run)
+        if flow == 'return':
+            rerun('choose', lambda: at.sidebar.selectbox[0].set_value("Return a bike").run())
+            at.sidebar.text_input[0].input(address)
+            rerun('find', lambda: at.sidebar.button[0].click().run())
+        elif flow == 'trip':
+            rerun('choose', lambda: at.sidebar.selectbox[0].set_value("Plan a trip").run())
+            at.sidebar.text_input[0].input(address)
+            at.sidebar.text_input[1].input(ADDRESSES[(index + 3) % len(ADDRESSES)])
+            rerun('find', lambda: at.sidebar.button[0].click().run())
+        else:
+            at.sidebar.text_input[0].input(address)
+            rerun('find', lambda: at.sidebar.button[0].click().run())
+    except Exception as e:
+        # E.g. a run that rendered an empty page has no widgets to drive; one bad session must not end the load test
+        print("Session {} ({}) failed: {!r}".format(index, flow, e))
+        return at, timings, errors + 1, True
+    # A session succeeded when the page shows its recommendation
+    found = any('Your Recommended' in str(md.value) for md in at.markdown)
+    return at, timings, errors, not found
+
+
+# Define the function to get a percentile from a sorted list
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    k = (len(values) - 1) * q
+    lo, hi = int(math.floor(k)), int(math.ceil(k))
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+# Define the function to run all sessions and summarise throughput, latency and memory
+def run_load(sessions, concurrency, flows, timeout):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_session, i, flows[i % len(flows)], timeout) for i in range(sessions)]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()  # Sessions are still referenced here, so their state counts
+
+    all_times = sorted(t for _, timings, _, _ in results for _, t in timings)
+    by_step = {}
+    for _, timings, _, _ in results:
+        for step, t in timings:
+            by_step.setdefault(step, []).append(t)
+    report = {
+        'sessions': sessions,
+        'concurrency': concurrency,
+        'flows': flows,
+        'elapsed_s': round(elapsed, 3),
+        'reruns': len(all_times),
+        'errors': sum(errors for _, _, errors, _ in results),
+        'failed_sessions': sum(1 for _, _, _, failed in results if failed),
+        'throughput_sessions_per_s': round(sessions / elapsed, 2),
+        'throughput_reruns_per_s': round(len(all_times) / elapsed, 2),
+        'rerun_ms': {name: round(percentile(all_times, q) * 1000, 1) for name, q in (('p50', .5), ('p95', .95), ('p99', .99))},
+        'rerun_ms_by_step': {step: {name: round(percentile(sorted(ts), q) * 1000, 1) for name, q in (('p50', .5), ('p95', .95), ('p99', .99))}
+                             for step, ts in by_step.items()},
+        'rss_mb': round(rss_after, 1),
+        'memory_per_session_mb': None,  # Filled in by add_memory_per_session
+        'snapshot_store': snapshot_store_stats(),
+    }
+    return report
+
+
+# Define the function to estimate memory per session from RSS growth between runs with different session counts
+def add_memory_per_session(reports, baseline):
+    """Each report gets (RSS - previous RSS) / (sessions - previous sessions), starting from the baseline run.
+    Dividing total growth by the session count would charge one-off costs (imports, caches, snapshots) to sessions."""
+    for report in reports:
+        added = report['sessions'] - baseline['sessions']
+        if added > 0:
+            report['memory_per_session_mb'] = round((report['rss_mb'] - baseline['rss_mb']) / added, 2)
+        baseline = report
+
+
+# Define the function to read the app's shared snapshot store, once the app has loaded it in this process
+def snapshot_store_stats():
+    helpers = sys.modules.get('helpers')
+    return None if helpers is None else helpers.snapshot_store.stats()
+
+
+# Define the function to print a human-readable report
+def print_report(report):
+    print("Sessions: {sessions} ({concurrency} concurrent), flows: {flows}".format(**report))
+    print("Elapsed: {elapsed_s}s, reruns: {reruns}, errors: {errors}, failed sessions: {failed_sessions}".format(**report))
+    print("Throughput: {throughput_sessions_per_s} sessions/s, {throughput_reruns_per_s} reruns/s".format(**report))
+    print("Rerun time: p50 {p50} ms, p95 {p95} ms, p99 {p99} ms".format(**report['rerun_ms']))
+    for step, stats in report['rerun_ms_by_step'].items():
+        print("  {:<7} p50 {p50} ms, p95 {p95} ms, p99 {p99} ms".format(step, **stats))
+    per_session = report['memory_per_session_mb']
+    print("Memory: {} MB RSS, {} MB per added session".format(report['rss_mb'], 'n/a' if per_session is None else per_session))
+    if report['snapshot_store']:
+        print("Snapshot store: {snapshots} snapshot(s), {bytes} of {budget_bytes} bytes".format(**report['snapshot_store']))
+
+
+# Define the function to parse "gbfs=0.05,nominatim=0.2,osrm=0.1" into a latency dict
+def parse_latency(text):
+    latency = {}
+    for item in filter(None, text.split(',')):
+        name, value = item.split('=')
+        latency[name.strip()] = float(value)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10, help='number of simulated sessions')
+    parser.add_argument('--concurrency', type=int, default=None, help='sessions running at once (default: all)')
+    parser.add_argument('--flows', default='rent,return', help='comma-separated flows to cycle through: rent, return, trip')
+    parser.add_argument('--latency', default='gbfs=0.05,nominatim=0.2,osrm=0.1', help='simulated upstream latency in seconds')
+    parser.add_argument('--stations', type=int, default=700, help='number of synthetic stations in the feeds')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds a single rerun may take')
+    parser.add_argument('--shared-cache', default=None, help='FINDBIKE_SHARED_CACHE for the run (default: fresh SQLite file)')
+    parser.add_argument('--sweep', default=None, help='comma-separated session counts to run in turn, e.g. 1,5,10,20, '
+                                                        'to check that memory per session stays flat as load grows')
+    parser.add_argument('--warmup', type=int, default=2, help='unreported sessions run first, so one-off costs are not '
+                                                               'counted as memory per session (default 2)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    share_test_runtime()
+    server = start_stubs(args.stations, parse_latency(args.latency))
+    shared_cache = args.shared_cache or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest-cache.sqlite3')
+    configure_app(server.server_address[1], shared_cache)
+
+    counts = [int(n) for n in args.sweep.split(',')] if args.sweep else [args.sessions]
+    flows = args.flows.split(',')
+    # The warm-up imports the app and fills its caches; its sessions set the memory baseline
+    baseline = {'sessions': 0, 'rss_mb': rss_mb()}
+    if args.warmup > 0:
+        baseline = run_load(args.warmup, min(args.concurrency or args.warmup, args.warmup), flows, args.timeout)
+    reports = [run_load(n, min(args.concurrency or n, n), flows, args.timeout) for n in counts]
+    add_memory_per_session(reports, baseline)
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports if args.sweep else reports[0], indent=2))
+        return
+    for report in reports:
+        print_report(report)
+        print()
+    if args.sweep:
+        print("{:>8} {:>10} {:>14}".format("sessions", "p95 ms", "MB/session"))
+        for report in reports:
+            per_session = report['memory_per_session_mb']
+            print("{:>8} {:>10} {:>14}".format(report['sessions'], report['rerun_ms']['p95'], 'n/a' if per_session is None else per_session))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import os  # Import os for the profile directory
+import sys  # Import sys to read other threads' stacks
+import json  # Import json for the profile summary
+import hmac  # Import hmac to compare profile tokens in constant time (as bytes, so any character is allowed)
+import math  # Import math to reject non-finite fractions
+import time  # Import time for sampling intervals and file names
+import random  # Import random to pick which reruns are profiled
+import threading  # Import threading for the sampler thread
+import tracemalloc  # Import tracemalloc for allocation snapshots
+from collections import Counter  # Import Counter to count identical stacks
+from config import PROFILE_SAMPLE, PROFILE_TOKEN, PROFILE_DIR, PROFILE_KEEP, PROFILE_INTERVAL_MS, PROFILE_ALLOC_SHARE  # Import profiling settings
+
+# Functions whose share of each profiled rerun is reported in the summary
+FOCUS = ('get_station_snapshot', 'query_station_status', 'create_enhanced_map', 'create_popup_html',
+         'get_bike_availability', 'run_osrm')
+
+# Frames kept per allocation traceback (the cost of tracing grows with it), and allocation sites written per profile
+ALLOC_FRAMES = 8
+ALLOC_SITES = 500
+
+# Profiles tracing allocations at once; tracemalloc is process-wide, so it runs while any of them does
+_active = 0
+_active_lock = threading.Lock()
+
+
+# Define the function to label a frame for a collapsed stack, e.g. "run_osrm (helpers.py:275)"
+def frame_label(code):
+    return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class RerunProfiler:
+    """Samples the stack of the thread running a script until the script's frame returns, then writes
+    collapsed CPU stacks, live allocations and a summary to the profile directory"""
+
+    def __init__(self, script_frame, directory=PROFILE_DIR, interval=PROFILE_INTERVAL_MS / 1000, keep=PROFILE_KEEP,
+                 allocations=False):
+        self.script_frame = script_frame
+        self.allocations = allocations
+        self.thread_id = threading.get_ident()
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.name = "{}-{:06x}".format(time.strftime("%Y%m%d-%H%M%S"), random.getrandbits(24))
+        self.thread = threading.Thread(target=self._run, name="rerun-profiler", daemon=True)
+
+    def start(self):
+        global _active
+        if self.allocations:
+            with _active_lock:
+                _active += 1
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(ALLOC_FRAMES)
+        self.thread.start()
+
+    # Define the function to read the profiled thread's stack from the script frame down, or None once it returned
+    def _stack(self):
+        frame = sys._current_frames().get(self.thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame.f_code))
+            if frame is self.script_frame:
+                return ';'.join(reversed(labels))
+            frame = frame.f_back
+        return None  # The rerun finished, stopped or raised
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            stack = self._stack()
+            if stack is None:
+                break
+            self.stacks[stack] += 1
+        self.script_frame = None  # Let the finished script's globals go
+        elapsed = time.perf_counter() - self.started
+        try:
+            self._write(elapsed)
+        except OSError as e:
+            print("Could not write profile:", e)
+        finally:
+            if self.allocations:
+                self._stop_tracing()
+
+    def _stop_tracing(self):
+        global _active
+        with _active_lock:
+            _active -= 1
+            if _active == 0:
+                tracemalloc.stop()
+
+    # Define the function to write the profile files and drop the oldest profiles beyond the retention limit
+    def _write(self, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.name)
+
+        # CPU: one "frame;frame;frame count" line per distinct stack, as flamegraph.pl and speedscope read
+        with open(base + ".cpu.folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+        # Allocations still alive at the end of the rerun, weighted by bytes
+        traced = peak = None
+        if self.allocations:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ])
+            traced, peak = tracemalloc.get_traced_memory()
+            with open(base + ".alloc.folded", "w") as f:
+                for stat in snapshot.statistics('traceback')[:ALLOC_SITES]:
+                    stack = ';'.join("{}:{}".format(os.path.basename(frame.filename), frame.lineno) for frame in stat.traceback)
+                    f.write("{} {}\n".format(stack, stat.size))
+
+        samples = sum(self.stacks.values())
+        focus = {name: 0 for name in FOCUS}
+        for stack, count in self.stacks.items():
+            for name in FOCUS:
+                if name + ' (' in stack:
+                    focus[name] += count
+        summary = {
+            'rerun_ms': round(elapsed * 1000, 1),
+            'samples': samples,
+            'interval_ms': self.interval * 1000,
+            'focus_ms': {name: round(count * self.interval * 1000, 1) for name, count in focus.items()},
+            'allocations_traced': self.allocations,  # Timings of a traced rerun are inflated by the tracing
+            'traced_bytes': traced,
+            'peak_traced_bytes': peak,
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        # Retention: profile names sort by time, so the oldest come first; leftovers of unfinished profiles go too
+        files = os.listdir(self.directory)
+        names = sorted({name.split('.')[0] for name in files})
+        expired = set(names[:max(0, len(names) - self.keep)])
+        for name in files:
+            if name.split('.')[0] in expired:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass  # Removed by another session's profile
+
+
+# Define the function to profile the calling script's rerun if it is sampled
+def profile_rerun(requested=None, token=None):
+    """Call at the top of the script. `requested` is the ?profile= query value, a fraction of this session's reruns
+    to profile, honoured only when `token` (?profile_token=) matches FINDBIKE_PROFILE_TOKEN; otherwise
+    FINDBIKE_PROFILE_SAMPLE applies. Returns the profiler, or None if this rerun is not sampled."""
+    fraction = PROFILE_SAMPLE
+    by_request = False
+    if requested and token and PROFILE_TOKEN and hmac.compare_digest(str(token).encode(), PROFILE_TOKEN.encode()):
+        try:
+            value = float(requested)
+        except ValueError:
+            value = float('nan')  # Not a number; keep the configured fraction
+        if math.isfinite(value):
+            fraction = min(max(value, 0.0), 1.0)
+            by_request = True
+    if fraction <= 0 or random.random() >= fraction:
+        return None
+    # Allocation tracing slows every session in the process, so a URL never turns it on
+    allocations = not by_request and random.random() < PROFILE_ALLOC_SHARE
+    profiler = RerunProfiler(sys._getframe(1), allocations=allocations)
+    profiler.start()
+    return profiler
@@ -0,0 +1,140 @@
+import time  # Import time for freshness and breaker timing
+import threading  # Import threading for locks shared across sessions
+from collections import OrderedDict  # Import OrderedDict for a bounded LRU cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout  # Import executor for deadlines and background refreshes
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails, times out or is short-circuited and no usable value is cached"""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised when the circuit breaker is open and the upstream is not being called"""
+
+
+class UpstreamBusyError(UpstreamError):
+    """Raised when every worker of an upstream is stuck on a call that has run past its deadline"""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures, then lets a single trial call through"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold  # Consecutive failures before opening
+        self.reset_timeout = reset_timeout  # Seconds to stay open before a trial call
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    # Define the function to check whether a call may go ahead
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True  # Closed
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.trial_running:
+                self.trial_running = True  # Half-open: let exactly one call probe the upstream
+                return True
+            return False
+
+    # Define the function to record a successful call
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    # Define the function to record a failed call
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()  # (Re)open the circuit
+
+
+class Upstream:
+    """Deadline, circuit breaker, request coalescing and stale-while-revalidate around one upstream"""
+
+    def __init__(self, name, timeout=5.0, fresh_for=30.0, stale_for=600.0, max_entries=1024, breaker=None, workers=4):
+        self.name = name
+        self.timeout = timeout  # Seconds a caller waits for a fetch before giving up
+        self.fresh_for = fresh_for  # Seconds a cached value is served without refreshing
+        self.stale_for = stale_for  # Seconds a cached value may still be served while a refresh runs
+        self.max_entries = max_entries
+        self.breaker = breaker or CircuitBreaker()
+        self._cache = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> Future of the one running fetch for that key
+        self._started = {}  # key -> when its fetch got a worker, to tell stuck calls from slow ones
+        self._lock = threading.Lock()
+        # Each upstream has its own workers, so a hung provider can only tie up its own calls
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upstream-" + name)
+
+    # Define the function to get a value for a key, calling fetch() only when needed
+    def call(self, key, fetch):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.fresh_for:
+                return value  # Fresh hit
+            if age < self.stale_for:
+                try:
+                    self._start_fetch(key, fetch)  # Refresh in the background, serve the stale value now
+                except UpstreamError:
+                    pass  # No refresh possible right now; the stale value is still good
+                return value
+
+        future = self._start_fetch(key, fetch)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise UpstreamError("{} did not answer within {}s".format(self.name, self.timeout))
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise UpstreamError("{} failed: {}".format(self.name, e)) from e
+
+    # Define the function to start (or join) the single in-flight fetch for a key
+    def _start_fetch(self, key, fetch):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future  # Coalesce with the fetch already running
+            # Busy workers free up within a deadline, so a new call queues for one; only calls stuck past
+            # their deadline on every worker mean it would wait out its whole deadline for nothing
+            now = time.monotonic()
+            stuck = sum(1 for started in self._started.values() if now - started > self.timeout)
+            if stuck >= self.workers:
+                raise UpstreamBusyError("{} is busy ({} calls stuck past {}s)".format(self.name, stuck, self.timeout))
+            if not self.breaker.allow():
+                raise CircuitOpenError("{} is unavailable (circuit open)".format(self.name))
+            future = self._executor.submit(self._run_fetch, key, fetch)
+            self._inflight[key] = future
+            return future
+
+    # Define the function that performs a fetch and records its outcome
+    def _run_fetch(self, key, fetch):
+        with self._lock:
+            self._started[key] = time.monotonic()
+        try:
+            value = fetch()
+        except Exception:
+            self.breaker.record_failure()
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._started.pop(key, None)
+            raise
+        self.breaker.record_success()
+        with self._lock:
+            self._cache[key] = (value, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)  # Evict the least recently used entry
+            self._inflight.pop(key, None)  # Only after caching, so no caller slips between the two
+            self._started.pop(key, None)
+        return value
@@ -0,0 +1,541 @@
+"""Offline routing over a street graph built from an OpenStreetMap extract.
+
+Parsing and contracting a city extract takes many minutes, so build the graph file once and point FINDBIKE_ROUTING_GRAPH at it:
+    python routing.py build toronto.osm data/toronto.graph.npz
+"""
+import io  # Import io to write graph files in one go
+import math  # Import math for distance calculations
+import time  # Import time for build timings
+import heapq  # Import heapq for the A* and contraction priority queues
+import argparse  # Import argparse for the command line interface
+from array import array  # Import array for compact, typed graph storage
+import xml.etree.ElementTree as ET  # Import ElementTree for streaming OSM XML parsing
+import numpy as np  # Import numpy to save and load graph arrays
+
+# Average travel speeds in km/h for each supported routing profile
+PROFILE_SPEEDS = {'foot': 5.0, 'bike': 15.0}
+
+# Highway types each profile may use unless the way's access tags say otherwise
+PROFILE_HIGHWAYS = {
+    'foot': {'footway', 'pedestrian', 'path', 'steps', 'living_street', 'residential', 'service',
+             'unclassified', 'track', 'tertiary', 'tertiary_link', 'secondary', 'secondary_link',
+             'primary', 'primary_link'},
+    'bike': {'cycleway', 'path', 'living_street', 'residential', 'service', 'unclassified', 'track',
+             'tertiary', 'tertiary_link', 'secondary', 'secondary_link', 'primary', 'primary_link'},
+}
+
+# Access tag checked for each profile (e.g. foot=no, bicycle=designated)
+PROFILE_ACCESS_TAG = {'foot': 'foot', 'bike': 'bicycle'}
+
+# Highway types that are never usable by walkers or cyclists
+BLOCKED_HIGHWAYS = {'motorway', 'motorway_link', 'trunk', 'trunk_link', 'construction', 'proposed'}
+
+# Size of a snapping grid cell in degrees (roughly 200 m in Toronto)
+GRID_CELL_DEG = 0.002
+
+# Nodes a witness search may settle while contracting; lower builds faster but adds more shortcuts
+WITNESS_LIMIT = 200
+
+# Longest street segment kept as one edge; longer chains keep a node every this many metres, so points along a
+# street still snap to a node close by
+MAX_SEGMENT_M = 100.0
+
+# Largest graph an .osm extract may give to be contracted at startup (about a second); larger ones need a graph file
+STARTUP_CONTRACT_NODES = 2000
+
+# Furthest a point may be from the street graph and still be snapped to it; callers estimate beyond this
+MAX_SNAP_M = 250.0
+
+EARTH_RADIUS_M = 6371008.8
+
+
+# Define the function to calculate the great-circle distance in metres between two (lat, lon) points
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+# Define the function to decide whether a way can be travelled by a profile, and in which directions
+def way_directions(tags, profile):
+    """Return (forward, backward) flags for a way with the given OSM tags"""
+    highway = tags.get('highway')
+    if highway is None or highway in BLOCKED_HIGHWAYS:
+        return False, False
+    access = tags.get(PROFILE_ACCESS_TAG[profile])
+    if access == 'no' or tags.get('access') in ('no', 'private'):
+        if access not in ('yes', 'designated', 'permissive'):
+            return False, False
+    if highway not in PROFILE_HIGHWAYS[profile] and access not in ('yes', 'designated', 'permissive'):
+        return False, False
+    if profile == 'foot':
+        return True, True  # Pedestrians may walk against one-way traffic
+    oneway = tags.get('oneway:bicycle', tags.get('oneway'))
+    if oneway is None and tags.get('junction') == 'roundabout':
+        oneway = 'yes'
+    if oneway in ('yes', '1', 'true'):
+        return True, False
+    if oneway == '-1':
+        return False, True
+    return True, True
+
+
+# Define the function to copy a numpy array into a typed array, which is faster to index from Python
+def _array(typecode, values):
+    out = array(typecode)
+    out.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return out
+
+
+# Define the function to turn per-node edge dicts into CSR arrays
+def _csr(rows):
+    offsets = array('l', [0])
+    targets = array('l')
+    lengths = array('f')
+    for row in rows:
+        for target, length in row.items():
+            targets.append(target)
+            lengths.append(length)
+        offsets.append(len(targets))
+    return offsets, targets, lengths
+
+
+# Define the function to contract a directed graph into a contraction hierarchy
+def contract(num_nodes, offsets, targets, lengths, witness_limit=WITNESS_LIMIT):
+    """Contract nodes one at a time, least important first, adding shortcut edges that keep shortest
+    distances between the nodes left. Returns (up, down) CSR arrays: up holds edges to higher-ranked
+    nodes for forward searches, down holds reversed edges from higher-ranked nodes for backward searches."""
+    out = [{} for _ in range(num_nodes)]  # node -> {target: metres} among nodes not yet contracted
+    inc = [{} for _ in range(num_nodes)]  # node -> {source: metres}
+    for u in range(num_nodes):
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            if v != u and lengths[e] < out[u].get(v, float('inf')):
+                out[u][v] = inc[v][u] = lengths[e]
+    up = [None] * num_nodes
+    down = [None] * num_nodes
+    deleted = [0] * num_nodes  # Contracted neighbours, which spreads contraction evenly over the graph
+    level = [0] * num_nodes  # Longest chain of contracted nodes below each node, which keeps the hierarchy shallow
+
+    # Define the function to find paths from source no longer than bound that avoid one node
+    def witness(source, avoid, bound, goals):
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < witness_limit:
+            d, node = heapq.heappop(heap)
+            if d > bound:
+                break
+            if d > dist[node]:
+                continue  # Stale queue entry
+            settled += 1
+            if node in goals:
+                goals.discard(node)
+                if not goals:
+                    break  # Every neighbour the shortcuts would lead to is settled
+            for nxt, w in out[node].items():
+                nd = d + w
+                if nxt != avoid and nd < dist.get(nxt, float('inf')):
+                    dist[nxt] = nd
+                    heapq.heappush(heap, (nd, nxt))
+        return dist  # Tentative distances are real path lengths too, so they count as witnesses
+
+    # Define the function to list the shortcuts contracting a node needs
+    def shortcuts(v):
+        needed = []
+        if not out[v]:
+            return needed
+        furthest = max(out[v].values())
+        for u, wu in inc[v].items():
+            dist = witness(u, v, wu + furthest, set(out[v]) - {u})
+            for x, wx in out[v].items():
+                if x != u and dist.get(x, float('inf')) > wu + wx:
+                    needed.append((u, x, wu + wx))
+        return needed
+
+    # Define the function to rate how costly contracting a node is now (lower goes first), with its shortcuts
+    def priority(v):
+        needed = shortcuts(v)
+        return 2 * (len(needed) - len(inc[v]) - len(out[v])) + deleted[v] + level[v], needed
+
+    queue = [(priority(v)[0], v) for v in range(num_nodes)]
+    heapq.heapify(queue)
+    while queue:
+        _, v = heapq.heappop(queue)
+        if up[v] is not None:
+            continue
+        current, needed = priority(v)
+        if queue and current > queue[0][0]:
+            heapq.heappush(queue, (current, v))  # Got costlier since it was queued; try the next one
+            continue
+        for u, x, w in needed:
+            if w < out[u].get(x, float('inf')):
+                out[u][x] = inc[x][u] = w
+        up[v], down[v] = out[v], inc[v]  # Every node still linked to v ranks higher than v
+        for x in out[v]:
+            del inc[x][v]
+            deleted[x] += 1
+            level[x] = max(level[x], level[v] + 1)
+        for u in inc[v]:
+            del out[u][v]
+            deleted[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+        out[v] = inc[v] = None
+    return _csr(up), _csr(down)
+
+
+# Define the function to find distances to the nodes an upward search of a hierarchy reaches
+def _upward_search(source, edges, reverse):
+    """Search edges from source; reverse holds the edges coming down into each node from the other direction.
+    Nodes reached more cheaply through one of those are stalled: their distance is not a shortest one, so they
+    are neither expanded nor returned."""
+    offsets, targets, lengths = edges
+    reverse_offsets, reverse_targets, reverse_lengths = reverse
+    dist = {source: 0.0}
+    settled = {}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue  # Stale queue entry
+        if any(dist.get(reverse_targets[e], float('inf')) + reverse_lengths[e] < d
+               for e in range(reverse_offsets[node], reverse_offsets[node + 1])):
+            continue  # Stall on demand
+        settled[node] = d
+        for e in range(offsets[node], offsets[node + 1]):
+            nxt = targets[e]
+            nd = d + lengths[e]
+            if nd < dist.get(nxt, float('inf')):
+                dist[nxt] = nd
+                heapq.heappush(heap, (nd, nxt))
+    return settled
+
+
+class StreetGraph:
+    """Street network held in compressed sparse row (CSR) arrays, one adjacency per profile. Nodes are junctions
+    (and points every MAX_SEGMENT_M along long streets); the shape of the street between them is kept separately."""
+
+    def __init__(self, lat, lon, adjacency, hierarchy=None, edge_shapes=None, shapes=None):
+        self.lat = lat  # array('d') of node latitudes
+        self.lon = lon  # array('d') of node longitudes
+        self.adjacency = adjacency  # profile -> (offsets, targets, lengths)
+        self.grids = {profile: self._build_grid(profile) for profile in adjacency}
+        self.hierarchy = hierarchy  # profile -> (upward CSR, reversed downward CSR) from contract(), or None
+        self.edge_shapes = edge_shapes  # profile -> array('l') of each edge's shape, ~shape when travelled backwards
+        self.shapes = shapes  # (offsets, lat, lon) arrays of the points inside each shape
+
+    # Define the function to open a graph file written by save(), or parse a small OSM XML extract
+    @classmethod
+    def open(cls, path):
+        if not path.endswith('.osm'):
+            return cls.load(path)
+        graph = cls.from_osm(path)
+        if len(graph.lat) <= STARTUP_CONTRACT_NODES:
+            graph.build_hierarchy()  # Quick for a small extract such as the bundled fixture
+        else:
+            print("{} is too large to contract at startup; duration matrices fall back to estimates. "
+                  "Build a graph file with 'python routing.py build'.".format(path))
+        return graph
+
+    # Define the function to contract every profile's graph so duration_matrix can use it
+    def build_hierarchy(self):
+        self.hierarchy = {profile: contract(len(self.lat), *edges) for profile, edges in self.adjacency.items()}
+
+    # Define the function to build a graph from an OSM XML extract
+    @classmethod
+    def from_osm(cls, path):
+        """Read the extract twice: ways first, then the coordinates of only the nodes those ways use. Chains of
+        nodes that only link two street segments are merged into one edge, keeping their points as its shape."""
+        node_coords = {}  # OSM node id -> (lat, lon) for nodes of routable ways, only kept while parsing
+        uses = {}  # OSM node id -> number of times routable ways pass through it
+        ways = []  # (node ids, {profile: (forward, backward)}) for each routable way
+
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag == 'node':
+                elem.clear()
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+                directions = {profile: way_directions(tags, profile) for profile in PROFILE_SPEEDS}
+                refs = [nd.get('ref') for nd in elem.iter('nd')]
+                if len(refs) > 1 and any(forward or backward for forward, backward in directions.values()):
+                    ways.append((refs, directions))
+                    for node_id in refs:
+                        uses[node_id] = uses.get(node_id, 0) + 1
+                    uses[refs[0]] += 1  # Way ends are always junctions
+                    uses[refs[-1]] += 1
+                elem.clear()
+
+        for node_id in uses:
+            node_coords[node_id] = None
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag == 'node':
+                if elem.get('id') in node_coords:
+                    node_coords[elem.get('id')] = (float(elem.get('lat')), float(elem.get('lon')))
+                elem.clear()
+            elif elem.tag in ('way', 'relation'):
+                elem.clear()
+
+        # Split ways into segments between junctions, renumbering the nodes kept densely from 0
+        index = {}
+        lat = array('d')
+        lon = array('d')
+        shape_offsets = array('l', [0])
+        shape_lat = array('d')
+        shape_lon = array('d')
+        edges = {profile: [] for profile in PROFILE_SPEEDS}  # profile -> list of (from, to, metres, shape)
+
+        # Define the function to get a kept node's number, adding it on first use
+        def node(node_id):
+            if node_id not in index:
+                index[node_id] = len(lat)
+                lat.append(node_coords[node_id][0])
+                lon.append(node_coords[node_id][1])
+            return index[node_id]
+
+        for refs, directions in ways:
+            start = None  # Position in refs where the current segment starts
+            for i, node_id in enumerate(refs):
+                coords = node_coords[node_id]
+                if coords is None:
+                    start = None  # The extract does not have this node, so the way is cut here
+                    continue
+                if start is None:
+                    start, metres, points = i, 0.0, []
+                    continue
+                previous = node_coords[refs[i - 1]]
+                metres += haversine_m(previous[0], previous[1], coords[0], coords[1])
+                last = i == len(refs) - 1 or node_coords[refs[i + 1]] is None
+                if not (last or uses[node_id] > 1 or metres >= MAX_SEGMENT_M):
+                    points.append(coords)  # Only links two segments of this way; part of the shape
+                    continue
+                a, b = node(refs[start]), node(node_id)
+                if a != b:
+                    shape = len(shape_offsets) - 1
+                    for point in points:
+                        shape_lat.append(point[0])
+                        shape_lon.append(point[1])
+                    shape_offsets.append(len(shape_lat))
+                    for profile, (forward, backward) in directions.items():
+                        if forward:
+                            edges[profile].append((a, b, metres, shape))
+                        if backward:
+                            edges[profile].append((b, a, metres, ~shape))
+                start, metres, points = i, 0.0, []
+        del node_coords, uses, ways
+
+        adjacency = {}
+        edge_shapes = {}
+        for profile, profile_edges in edges.items():
+            profile_edges.sort()
+            offsets = array('l', [0]) * (len(lat) + 1)
+            targets = array('l')
+            lengths = array('f')
+            shapes = array('l')
+            for a, b, metres, shape in profile_edges:
+                offsets[a + 1] += 1
+                targets.append(b)
+                lengths.append(metres)
+                shapes.append(shape)
+            for i in range(len(lat)):
+                offsets[i + 1] += offsets[i]  # Turn per-node counts into row offsets
+            adjacency[profile] = (offsets, targets, lengths)
+            edge_shapes[profile] = shapes
+        return cls(lat, lon, adjacency, edge_shapes=edge_shapes, shapes=(shape_offsets, shape_lat, shape_lon))
+
+    # Define the function to write the graph arrays to a compact binary file
+    def save(self, path):
+        """Write the graph, its street shapes and its contraction hierarchy; call build_hierarchy() first"""
+        arrays = {'lat': np.asarray(self.lat), 'lon': np.asarray(self.lon)}
+        for name, values in zip(('shape_offsets', 'shape_lat', 'shape_lon'), self.shapes):
+            arrays[name] = np.asarray(values)
+        for profile, (offsets, targets, lengths) in self.adjacency.items():
+            arrays[profile + '_offsets'] = np.asarray(offsets)
+            arrays[profile + '_targets'] = np.asarray(targets)
+            arrays[profile + '_lengths'] = np.asarray(lengths)
+            arrays[profile + '_shapes'] = np.asarray(self.edge_shapes[profile])
+            for name, (offsets, targets, lengths) in zip(('up', 'down'), self.hierarchy[profile]):
+                arrays['{}_{}_offsets'.format(profile, name)] = np.asarray(offsets)
+                arrays['{}_{}_targets'.format(profile, name)] = np.asarray(targets)
+                arrays['{}_{}_lengths'.format(profile, name)] = np.asarray(lengths)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)  # Plain arrays, no pickling
+        with open(path, 'wb') as f:
+            f.write(buffer.getvalue())
+
+    # Define the function to read a graph file written by save()
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            lat = _array('d', npz['lat'])
+            lon = _array('d', npz['lon'])
+            shapes = (_array('l', npz['shape_offsets']), _array('d', npz['shape_lat']), _array('d', npz['shape_lon']))
+            adjacency = {}
+            edge_shapes = {}
+            hierarchy = {}
+            for profile in PROFILE_SPEEDS:
+                adjacency[profile] = (_array('l', npz[profile + '_offsets']), _array('l', npz[profile + '_targets']),
+                                      _array('f', npz[profile + '_lengths']))
+                edge_shapes[profile] = _array('l', npz[profile + '_shapes'])
+                hierarchy[profile] = tuple(
+                    (_array('l', npz['{}_{}_offsets'.format(profile, name)]),
+                     _array('l', npz['{}_{}_targets'.format(profile, name)]),
+                     _array('f', npz['{}_{}_lengths'.format(profile, name)]))
+                    for name in ('up', 'down'))
+        return cls(lat, lon, adjacency, hierarchy, edge_shapes, shapes)
+
+    # Define the function to bucket a profile's routable nodes into a coarse lat/lon grid for snapping
+    def _build_grid(self, profile):
+        offsets, targets, _ = self.adjacency[profile]
+        routable = set(targets)
+        routable.update(i for i in range(len(self.lat)) if offsets[i + 1] > offsets[i])
+        grid = {}
+        for i in routable:
+            cell = (int(self.lat[i] // GRID_CELL_DEG), int(self.lon[i] // GRID_CELL_DEG))
+            grid.setdefault(cell, array('l')).append(i)
+        return grid
+
+    # Define the function to find the graph node closest to a (lat, lon) point
+    def nearest_node(self, latlon, profile, max_distance=MAX_SNAP_M):
+        """Return (node, metres away), or (None, inf) when no node is within max_distance"""
+        grid = self.grids[profile]
+        if not grid:
+            raise ValueError("Street graph has no routable nodes for profile '{}'".format(profile))
+        cy, cx = int(latlon[0] // GRID_CELL_DEG), int(latlon[1] // GRID_CELL_DEG)
+        best, best_dist = None, float('inf')
+        ring = 0
+        cell_m = GRID_CELL_DEG * 111000 * math.cos(math.radians(latlon[0]))  # Narrowest side of a cell
+        max_ring = int(math.ceil(max_distance / cell_m))  # Rings that can hold a node within max_distance
+        while ring <= max_ring:
+            for y in range(cy - ring, cy + ring + 1):
+                for x in range(cx - ring, cx + ring + 1):
+                    if max(abs(y - cy), abs(x - cx)) != ring:
+                        continue  # Only visit the outer ring of cells
+                    for i in grid.get((y, x), ()):
+                        d = haversine_m(latlon[0], latlon[1], self.lat[i], self.lon[i])
+                        if d < best_dist:
+                            best, best_dist = i, d
+            # Nothing in a further ring can beat a match closer than the ring's inner edge
+            if best is not None and best_dist <= ring * cell_m:
+                break
+            ring += 1
+        if best_dist > max_distance:
+            return None, float('inf')
+        return best, best_dist
+
+    # Define the function to find the shortest path between two nodes with A*
+    def shortest_path(self, source, target, profile):
+        offsets, targets, lengths = self.adjacency[profile]
+        lat, lon = self.lat, self.lon
+        tlat, tlon = lat[target], lon[target]
+        dist = {source: 0.0}
+        previous = {}  # node -> edge it was reached by
+        heap = [(haversine_m(lat[source], lon[source], tlat, tlon), 0.0, source)]
+        while heap:
+            _, d, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if d > dist[node]:
+                continue  # Stale queue entry
+            for e in range(offsets[node], offsets[node + 1]):
+                nxt = targets[e]
+                nd = d + lengths[e]
+                if nd < dist.get(nxt, float('inf')):
+                    dist[nxt] = nd
+                    previous[nxt] = (node, e)
+                    heapq.heappush(heap, (nd + haversine_m(lat[nxt], lon[nxt], tlat, tlon), nd, nxt))
+        if target not in dist:
+            raise ValueError("No route found between the requested points")
+        path = [target]
+        edges = []
+        while path[-1] != source:
+            node, e = previous[path[-1]]
+            path.append(node)
+            edges.append(e)
+        path.reverse()
+        edges.reverse()
+        return path, edges, dist[target]
+
+    # Define the function to list the street shape points inside an edge, in the direction it is travelled
+    def _edge_points(self, profile, e):
+        if self.edge_shapes is None:
+            return []  # Straight edges, e.g. a synthetic graph
+        shape = self.edge_shapes[profile][e]
+        offsets, shape_lat, shape_lon = self.shapes
+        index = ~shape if shape < 0 else shape
+        points = [[shape_lat[k], shape_lon[k]] for k in range(offsets[index], offsets[index + 1])]
+        return points[::-1] if shape < 0 else points
+
+    # Define the function to route between two (lat, lon) points, matching run_osrm's return value
+    def route(self, start, end, profile='foot'):
+        if profile not in PROFILE_SPEEDS:
+            raise ValueError("Unsupported routing profile '{}'".format(profile))
+        source, source_gap = self.nearest_node(start, profile)
+        target, target_gap = self.nearest_node(end, profile)
+        if source is None or target is None:
+            raise ValueError("Point is more than {} m from the street graph".format(MAX_SNAP_M))
+        path, edges, length = self.shortest_path(source, target, profile)
+        coordinates = [[self.lat[source], self.lon[source]]]  # [lat, lon] pairs like run_osrm
+        for node, e in zip(path[1:], edges):
+            coordinates.extend(self._edge_points(profile, e))
+            coordinates.append([self.lat[node], self.lon[node]])
+        metres = source_gap + length + target_gap  # Include the walk on/off the street network
+        duration = round(metres / (PROFILE_SPEEDS[profile] * 1000 / 60), 1)  # Convert to minutes
+        return coordinates, duration
+
+    # Define the function to compute travel times in minutes from every source to every target point
+    def duration_matrix(self, sources, targets, profile='foot'):
+        """Return a len(sources) x len(targets) list of durations using bucket-based many-to-many search over
+        the contraction hierarchy; pairs that are unreachable or off the graph are inf"""
+        if profile not in PROFILE_SPEEDS:
+            raise ValueError("Unsupported routing profile '{}'".format(profile))
+        if self.hierarchy is None:
+            raise ValueError("Street graph has no contraction hierarchy; build a graph file with routing.py build")
+        up, down = self.hierarchy[profile]
+        metres_per_minute = PROFILE_SPEEDS[profile] * 1000 / 60
+
+        # Backward upward search from every target, leaving (target, distance) in a bucket at each node reached
+        buckets = {}
+        for j, point in enumerate(targets):
+            node, gap = self.nearest_node(point, profile)
+            if node is None:
+                continue
+            for reached, d in _upward_search(node, down, up).items():
+                buckets.setdefault(reached, []).append((j, d + gap))
+
+        # Forward upward search from every source; the best meeting node gives each shortest distance
+        matrix = []
+        for point in sources:
+            best = [float('inf')] * len(targets)
+            node, gap = self.nearest_node(point, profile)
+            if node is not None:
+                for reached, d in _upward_search(node, up, down).items():
+                    for j, rest in buckets.get(reached, ()):
+                        if d + rest < best[j]:
+                            best[j] = d + rest
+            matrix.append([round((gap + metres) / metres_per_minute, 1) for metres in best])  # inf stays inf
+        return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a graph file from an OSM XML extract')
+    build.add_argument('osm', help='OSM XML extract')
+    build.add_argument('graph', help='graph file to write (.npz)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = StreetGraph.from_osm(args.osm)
+    edges = {profile: len(adjacency[1]) for profile, adjacency in graph.adjacency.items()}
+    print("Parsed {} nodes, edges per profile {} in {:.1f} s".format(len(graph.lat), edges, time.perf_counter() - start))
+    start = time.perf_counter()
+    graph.build_hierarchy()
+    print("Contracted in {:.1f} s".format(time.perf_counter() - start))
+    graph.save(args.graph)
+
+
+if __name__ == '__main__':
+    main()
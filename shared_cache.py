@@ -0,0 +1,163 @@
+import os  # Import os for process ids and file paths
+import json  # Import json for serializing small values
+import time  # Import time for expiry and polling
+import zlib  # Import zlib to store values compactly
+import socket  # Import socket to name this replica
+import hashlib  # Import hashlib to shorten long keys
+import sqlite3  # Import sqlite3 for the local shared cache file
+import threading  # Import threading for per-thread SQLite connections
+
+# Identifies this replica when it holds a refresh lock
+REPLICA_ID = "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+class SQLiteCache:
+    """Shared cache in a SQLite file; replicas on the same host (or a shared volume) see each other's values.
+
+    Exposes the subset of the Redis interface the app needs: get, set (with ex/nx) and delete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections must not be shared across threads
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+        )
+
+    # Define the function to get this thread's connection
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)  # Autocommit
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, value, ex=None, nx=False):
+        now = time.time()
+        expires = None if ex is None else now + ex
+        conn = self._connect()
+        if nx:
+            # Only insert when the key is missing or expired, like Redis SET NX
+            cur = conn.execute(
+                "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+                "WHERE kv.expires IS NOT NULL AND kv.expires <= ?",
+                (key, value, expires, now),
+            )
+            return cur.rowcount == 1
+        conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+        if hash(key) % 100 == 0:
+            conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))  # Occasional purge
+        return True
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+class RedisCache:
+    """Shared cache on a Redis (or Redis-compatible) server, for replicas on different hosts"""
+
+    def __init__(self, url):
+        try:
+            import redis  # Optional dependency, only needed for this backend
+        except ImportError as e:
+            raise ImportError("The redis package is required for a redis:// shared cache (pip install redis)") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=2)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        return bool(self.client.set(key, value, ex=None if ex is None else max(1, int(ex)), nx=nx))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+# Define the function to open the backend named by a URL ("sqlite:///path", "redis://host:port/0"); empty disables it
+def open_cache(url):
+    if not url or url == 'none':
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url)
+    raise ValueError("Unsupported shared cache URL '{}'".format(url))
+
+
+class SharedCache:
+    """Compressed get-or-fetch on top of a backend, with one replica elected to refresh each key"""
+
+    def __init__(self, backend, namespace='findbike'):
+        self.backend = backend
+        self.namespace = namespace
+
+    # Define the function to build a backend key, hashing keys that are too long (e.g. OSRM table URLs)
+    def _key(self, key):
+        if len(key) > 200:
+            key = key[:100] + hashlib.sha1(key.encode()).hexdigest()
+        return "{}:{}".format(self.namespace, key)
+
+    # Define the function to read a backend value, treating backend errors as a miss
+    def _get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print("Shared cache unavailable:", e)
+            return None
+        return None if value is None else zlib.decompress(value)
+
+    # Define the function to get bytes for a key, calling fetch() when no replica has a fresh copy
+    def get_or_fetch(self, key, fetch, ttl, elect=False, wait=5.0):
+        """Return bytes for key; with elect=True only the replica holding the lock calls fetch().
+
+        wait is the caller's deadline: the lock lasts that long, and other replicas wait at most half of it for
+        the leader's value, so they still have time to fetch it themselves.
+        """
+        if self.backend is None:
+            return fetch()  # Shared caching disabled
+        key = self._key(key)
+        value = self._get(key)
+        if value is not None:
+            return value
+        lock_key = key + ':lock'
+        leader = False
+        if elect:
+            try:
+                leader = self.backend.set(lock_key, REPLICA_ID.encode(), ex=wait, nx=True)
+            except Exception:
+                leader = True  # No backend, no election
+            if not leader:
+                # Another replica is refreshing; wait for its value before fetching ourselves
+                deadline = time.monotonic() + wait / 2
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self._get(key)
+                    if value is not None:
+                        return value
+        try:
+            value = fetch()
+            try:
+                self.backend.set(key, zlib.compress(value), ex=ttl)
+            except Exception as e:
+                print("Shared cache unavailable:", e)
+        finally:
+            if leader:
+                try:
+                    self.backend.delete(lock_key)  # Release the lock even when fetch() failed, so others retry now
+                except Exception as e:
+                    print("Shared cache unavailable:", e)
+        return value
+
+    # Define the function to get a JSON-serializable value for a key, calling fetch() on a miss
+    def get_or_fetch_json(self, key, fetch, ttl, elect=False):
+        raw = self.get_or_fetch(key, lambda: json.dumps(fetch(), separators=(',', ':')).encode(), ttl, elect)
+        return json.loads(raw)
@@ -0,0 +1,52 @@
+import threading  # Import threading for a store shared by all sessions
+from collections import OrderedDict  # Import OrderedDict to evict the oldest snapshot first
+
+
+class SnapshotStore:
+    """Holds each station snapshot once per process and evicts the oldest ones beyond a memory budget.
+
+    Snapshots are treated as read-only: callers get shallow copies, and pandas copy-on-write makes
+    any modification of a copy allocate its own data instead of touching the shared frame.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._snapshots = OrderedDict()  # key -> (frame, nbytes), oldest first
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # One session builds a new snapshot, the others wait for it
+
+    # Define the function to look up a snapshot by key
+    def get(self, key):
+        with self._lock:
+            entry = self._snapshots.get(key)
+        return None if entry is None else entry[0]
+
+    # Define the function to add a snapshot and evict old ones until the store fits its budget
+    def put(self, key, frame):
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._snapshots[key] = (frame, nbytes)
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > 1 and self.nbytes() > self.budget_bytes:
+                self._snapshots.popitem(last=False)  # Always keep the newest snapshot
+        return frame
+
+    # Define the function to get a snapshot, building it once if no session has yet
+    def get_or_build(self, key, build):
+        frame = self.get(key)
+        if frame is not None:
+            return frame
+        with self._build_lock:
+            frame = self.get(key)  # Another session may have built it while we waited
+            if frame is None:
+                frame = self.put(key, build())
+        return frame
+
+    # Define the function to get the total size of the held snapshots
+    def nbytes(self):
+        return sum(nbytes for _, nbytes in self._snapshots.values())
+
+    # Define the function to report what the store currently holds
+    def stats(self):
+        with self._lock:
+            return {'snapshots': len(self._snapshots), 'bytes': self.nbytes(), 'budget_bytes': self.budget_bytes}
@@ -0,0 +1,38 @@
+import numpy as np  # Import numpy for vectorized comparisons
+
+# Station fields the live map shows; a station is sent again when any of them changes
+LIVE_COLUMNS = ['lat', 'lon', 'num_bikes_available', 'ebike', 'mechanical', 'num_docks_available']
+
+
+# Define the function to index a snapshot by station, keeping only stations that can be placed on a map
+def _by_station(df, columns):
+    df = df.drop_duplicates('station_id', keep='last')  # A station may report twice in one feed
+    df = df[df['lat'].notna() & df['lon'].notna()]
+    return df.set_index('station_id')[columns]
+
+
+# Define the function to list stations as [station_id, lat, lon, bikes, ebikes, mechanical, docks] rows
+def station_rows(df, columns=LIVE_COLUMNS):
+    if df.index.name != 'station_id':
+        df = _by_station(df, columns)
+    counts = df[columns[2:]].fillna(0).astype('int64')  # Whole numbers keep the JSON small
+    return [[station_id, lat, lon] + row for station_id, lat, lon, row in
+            zip(df.index.tolist(), df['lat'].tolist(), df['lon'].tolist(), counts.values.tolist())]
+
+
+# Define the function to find what changed between two station snapshots
+def diff_stations(old, new, columns=LIVE_COLUMNS):
+    """Compare two snapshots by station_id. Returns {'upsert': rows for new or changed stations,
+    'remove': ids of stations that are gone}, with rows as produced by station_rows."""
+    old = _by_station(old, columns)
+    new = _by_station(new, columns)
+    common = new.index.intersection(old.index)
+    before = old.loc[common].to_numpy(dtype=float)
+    after = new.loc[common].to_numpy(dtype=float)
+    # One elementwise pass over every field of every station; NaN on both sides is not a change
+    changed = ((before != after) & ~(np.isnan(before) & np.isnan(after))).any(axis=1)
+    upsert = common[changed].append(new.index.difference(old.index))
+    return {
+        'upsert': station_rows(new.loc[upsert], columns),
+        'remove': old.index.difference(new.index).tolist(),
+    }